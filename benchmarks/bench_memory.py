@@ -0,0 +1,44 @@
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from prolog.interpreter import Database
+from prolog.parser import Parser
+from prolog.scanner import Scanner
+from prolog.hashcons import TermPool
+
+
+def fact_base(size):
+    return ''.join(
+        f'employee(e{i}, dept{i % 50}, {i % 90 + 18}, [skill{i % 7}, skill{i % 11}]).\n'
+        for i in range(size)
+    )
+
+
+def measure(size, hashcons=False):
+    source = fact_base(size)
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    pool = TermPool() if hashcons else None
+    database = Database(Parser(Scanner(source).tokenize(), pool=pool).parse())
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return database, after - before
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    hashcons = '--hashcons' in sys.argv[2:]
+    database, used = measure(size, hashcons)
+    print(f'clauses:          {len(database.store)}')
+    print(f'bytes total:      {used}')
+    print(f'bytes per clause: {used / size:.1f}')
+
+
+if __name__ == '__main__':
+    main()
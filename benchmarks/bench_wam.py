@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from prolog.interpreter import Database
+from prolog.parser import Parser
+from prolog.scanner import Scanner
+from prolog.types import FALSE
+from prolog.wam import WamEngine
+
+
+def program(size):
+    edges = ''.join(f'edge(n{i}, n{i + 1}).\n' for i in range(size))
+    parents = ''.join(f'parent(p{i}, p{i // 2}).\n' for i in range(1, size * 10))
+    return edges + parents + '''
+path(X, Y) :- edge(X, Y).
+path(X, Y) :- edge(X, Z), path(Z, Y).
+grand(X, Z) :- parent(X, Y), parent(Y, Z).
+'''
+
+
+def run(database, text, repeat):
+    query = Parser(Scanner(text).tokenize()).parse_query()
+    start = time.perf_counter()
+    count = 0
+    for _ in range(repeat):
+        for solution in database.execute(query):
+            if not isinstance(solution, FALSE):
+                count += 1
+    return time.perf_counter() - start, count
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    rules = Parser(Scanner(program(size)).tokenize()).parse()
+    engines = [
+        ('tree', Database(rules)),
+        ('wam', Database(rules, engine=WamEngine)),
+    ]
+    for text in ['path(n0, Y).', 'grand(X, Y).']:
+        for name, database in engines:
+            used, count = run(database, text, repeat)
+            print(f'{text:<13} {name:<5} {used:8.3f}s  answers: {count}')
+
+
+if __name__ == '__main__':
+    main()
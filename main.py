@@ -1,11 +1,13 @@
 #-*- coding: utf-8 -*-
 
 import re
+import sys
 import codecs
 from prolog.interpreter import Database, Variable, Rule
 from prolog.parser import Parser
 from prolog.scanner import Scanner
-from prolog.types import FALSE, CUT, Dot, Bar, Arithmetic
+from prolog.hashcons import TermPool
+from prolog.types import FALSE, Dot, Bar, Arithmetic
 
 DATABASE = r"^\[[A-Za-z0-9_]+\]\."
 
@@ -44,6 +46,7 @@ def display_answer(goal, solution, stream_reader = None):
 
 
 if __name__ == '__main__':
+    hashcons = '--hashcons' in sys.argv[1:]  # общие экземпляры основных термов базы
     database = None
     haveData = False
     while True:
@@ -58,7 +61,8 @@ if __name__ == '__main__':
             except:
                 print("ERROR: source '" + file_name + ".pl' does not exist")
             rules = Parser(
-                Scanner(database_content).tokenize()
+                Scanner(database_content).tokenize(),
+                pool=TermPool() if hashcons else None
             ).parse()
 
             database = Database(rules)
@@ -75,8 +79,6 @@ if __name__ == '__main__':
                 is_first_iter = False
                 has_solution = False
                 for solution in database.execute(goal):
-                    if isinstance(solution, CUT):
-                        break
                     if not isinstance(solution, FALSE):
                         has_solution = True
                     if is_first_iter is False:
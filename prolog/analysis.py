@@ -0,0 +1,388 @@
+from .types import Variable, Term, Dot, Bar, Arithmetic, Logic, TRUE
+from .expression import BinaryExpression, PrimaryExpression
+from .builtins import Write, Nl, Tab, Fail, Cut, Retract, AssertA, AssertZ, DatabaseOp
+from .index import arg_key
+
+DET = 'det'          # ровно одно решение
+SEMIDET = 'semidet'  # не больше одного решения
+NONDET = 'nondet'    # решений может быть несколько
+
+RANK = {DET: 0, SEMIDET: 1, NONDET: 2}
+
+INPUT = '+'    # аргумент должен быть связан при вызове
+OUTPUT = '-'   # аргумент связывается самим предикатом
+UNKNOWN = '?'
+
+MODE_RANK = {UNKNOWN: 0, OUTPUT: 1, INPUT: 2}
+
+
+def worst(left, right):
+    return left if RANK[left] >= RANK[right] else right
+
+
+class PredicateInfo:
+    __slots__ = ('name', 'arity', 'clauses', 'modes', 'determinism', 'exclusive', 'facts',
+                 'pure')
+
+    def __init__(self, name, arity, clauses):
+        self.name = name
+        self.arity = arity
+        self.clauses = clauses             # правила предиката по порядку
+        self.modes = (UNKNOWN,) * arity
+        self.determinism = DET             # без учёта связанности аргументов
+        self.exclusive = tuple(range(arity))  # связанный аргумент отсекает все клаузы, кроме одной
+        self.facts = False                 # все клаузы - основные факты
+        self.pure = True                   # нет вывода и изменений базы, в том числе в вызываемых
+
+    def deterministic(self, goal):
+        if self.determinism != NONDET:
+            return True
+        for pos in self.exclusive:
+            if arg_key(goal.args[pos]) is not None:
+                return True
+        return False
+
+    def __str__(self):
+        modes = ', '.join(self.modes)
+        return f'{self.name}/{self.arity}: {self.determinism} ({modes})'
+
+    def __repr__(self):
+        return str(self)
+
+
+def body_goals(body, goals=None):
+    if goals is None:
+        goals = []
+    if isinstance(body, TRUE):
+        pass
+    elif isinstance(body, Term) and body.pred is None:
+        # конъюнкция: у неё нет имени предиката
+        for goal in body.args:
+            body_goals(goal, goals)
+    else:
+        goals.append(body)
+    return goals
+
+
+def expression_names(expr, names):
+    if isinstance(expr, BinaryExpression):
+        expression_names(expr.left, names)
+        expression_names(expr.right, names)
+    elif isinstance(expr, PrimaryExpression):
+        expression_names(expr.exp, names)
+    elif type(expr) is Variable:
+        names.add(expr.name)
+    return names
+
+
+def variable_names(term, names):
+    if type(term) is Variable:
+        names.add(term.name)
+    elif isinstance(term, (Term, Write)):
+        for arg in term.args:
+            variable_names(arg, names)
+    elif isinstance(term, Dot):
+        for item in term:
+            variable_names(item, names)
+    elif isinstance(term, Bar):
+        variable_names(term.head, names)
+        variable_names(term.tail, names)
+    elif isinstance(term, Arithmetic):
+        variable_names(term.target, names)
+        expression_names(term._expression, names)
+    elif isinstance(term, Logic):
+        expression_names(term._expression, names)
+    elif isinstance(term, DatabaseOp):
+        variable_names(term.arg, names)
+    return names
+
+
+def head_determinism(head):
+    # голова из разных переменных сопоставляется с любым вызовом
+    seen = set()
+    for arg in head.args:
+        if type(arg) is not Variable or arg.name in seen:
+            return SEMIDET
+        if arg.name != '_':
+            seen.add(arg.name)
+    return DET
+
+
+def goal_determinism(goal, table):
+    if isinstance(goal, (Write, Nl, Tab, AssertA, AssertZ)):
+        return DET
+    if isinstance(goal, (Retract, Fail, Arithmetic, Logic)):
+        return SEMIDET
+    if not isinstance(goal, Term):
+        return NONDET
+    info = table.get(goal.key, None)
+    if info is None:
+        return SEMIDET  # клауз нет, вызов просто неудачен
+    if info.determinism != NONDET:
+        return info.determinism
+    if info.deterministic(goal):
+        return SEMIDET
+    return NONDET
+
+
+def clause_determinism(rule, table):
+    result = head_determinism(rule.head)
+    for goal in body_goals(rule.body):
+        if isinstance(goal, Cut):
+            # отсечение убирает альтернативы целей до него
+            result = SEMIDET if result == NONDET else result
+        else:
+            result = worst(result, goal_determinism(goal, table))
+    return result
+
+
+def goal_pure(goal, table):
+    if isinstance(goal, (Write, Nl, Tab, DatabaseOp)):
+        return False
+    if isinstance(goal, Term):
+        info = table.get(goal.key, None)
+        return info is None or info.pure
+    return True
+
+
+def has_cut(rule):
+    return any(isinstance(goal, Cut) for goal in body_goals(rule.body))
+
+
+def exclusive_positions(rules, arity):
+    positions = []
+    for pos in range(arity):
+        keys = set()
+        for rule in rules:
+            key = arg_key(rule.head.args[pos])
+            if key is None or key in keys:
+                break
+            keys.add(key)
+        else:
+            positions.append(pos)
+    return tuple(positions)
+
+
+def predicate_determinism(info, table):
+    rules = info.clauses
+    clauses = [clause_determinism(rule, table) for rule in rules]
+    if any(det == NONDET for det in clauses):
+        return NONDET, ()
+    exclusive = exclusive_positions(rules, info.arity)
+    if len(rules) == 1:
+        return clauses[0], exclusive
+    if all(has_cut(rule) for rule in rules[:-1]):
+        # каждая клауза, кроме последней, фиксирует выбор
+        return SEMIDET, exclusive
+    return NONDET, exclusive
+
+
+def argument_mode(name, goals, table):
+    # режим определяет первая цель тела, в которой встречается переменная
+    for goal in goals:
+        if isinstance(goal, Arithmetic):
+            if type(goal.target) is Variable and goal.target.name == name:
+                return OUTPUT
+            if name in expression_names(goal._expression, set()):
+                return INPUT
+        elif isinstance(goal, Logic):
+            if name in expression_names(goal._expression, set()):
+                return INPUT
+        elif isinstance(goal, Term) and goal.key in table:
+            modes = table[goal.key].modes
+            for pos, arg in enumerate(goal.args):
+                if type(arg) is Variable and arg.name == name:
+                    return modes[pos]
+            if name in variable_names(goal, set()):
+                return UNKNOWN
+        elif name in variable_names(goal, set()):
+            return UNKNOWN
+    return UNKNOWN
+
+
+def predicate_modes(info, table):
+    modes = [UNKNOWN] * info.arity
+    for rule in info.clauses:
+        goals = body_goals(rule.body)
+        for pos, arg in enumerate(rule.head.args):
+            if type(arg) is not Variable or arg.name == '_':
+                continue
+            mode = argument_mode(arg.name, goals, table)
+            if MODE_RANK[mode] > MODE_RANK[modes[pos]]:
+                modes[pos] = mode
+    return tuple(modes)
+
+
+def facts_only(info):
+    return all(isinstance(rule.body, TRUE) and rule.head.ground for rule in info.clauses)
+
+
+def settle(table, infos):
+    # неподвижная точка по infos, остальные оценки таблицы уже окончательны;
+    # оценки только ухудшаются, начиная с det
+    for info in infos:
+        info.determinism = DET
+        info.exclusive = tuple(range(info.arity))
+        info.modes = (UNKNOWN,) * info.arity
+        info.pure = True
+    changed = True
+    while changed:
+        changed = False
+        for info in infos:
+            determinism, exclusive = predicate_determinism(info, table)
+            modes = predicate_modes(info, table)
+            pure = all(
+                goal_pure(goal, table)
+                for rule in info.clauses for goal in body_goals(rule.body)
+            )
+            if determinism != info.determinism or exclusive != info.exclusive or \
+               modes != info.modes or pure != info.pure:
+                info.determinism = determinism
+                info.exclusive = exclusive
+                info.modes = modes
+                info.pure = pure
+                changed = True
+
+
+def analyse(rules):
+    table = {}
+    for rule in rules:
+        head = rule.head
+        if not isinstance(head, Term):
+            continue
+        info = table.get(head.key, None)
+        if info is None:
+            info = PredicateInfo(head.pred, len(head.args), [])
+            table[head.key] = info
+        info.clauses.append(rule)
+    for info in table.values():
+        info.facts = facts_only(info)
+    settle(table, list(table.values()))
+    return table
+
+
+def ground_fact(rule):
+    return isinstance(rule.body, TRUE) and isinstance(rule.head, Term) and rule.head.ground
+
+
+class Analysis:
+    # результат analyse, который поддерживается при assert/retract: заново
+    # оцениваются только изменённые предикаты и те, что их вызывают, а
+    # предикаты из одних фактов обновляются на месте по статистике хранилища
+    def __init__(self, rules, statistics):
+        self.table = analyse(rules)
+        self.statistics = statistics
+        self.callers = {}    # функтор -> функторы предикатов, в телах которых он вызван
+        self.dirty = set()   # предикаты, которые надо оценить заново
+        self.touched = set() # предикаты, у вызывающих которых оценки могли измениться
+        for key, info in self.table.items():
+            for rule in info.clauses:
+                self.link(key, rule)
+
+    def link(self, key, rule):
+        # рёбра только добавляются: лишний вызывающий стоит одной переоценки
+        for goal in body_goals(rule.body):
+            if isinstance(goal, Term):
+                self.callers.setdefault(goal.key, set()).add(key)
+
+    def insert(self, rule, first=False):
+        head = rule.head
+        if not isinstance(head, Term):
+            return
+        info = self.table.get(head.key, None)
+        if info is None:
+            info = PredicateInfo(head.pred, len(head.args), [])
+            info.facts = True
+            self.table[head.key] = info
+            self.touched.add(head.key)  # раньше вызовы были просто неудачны
+        if first:
+            info.clauses.insert(0, rule)
+        else:
+            info.clauses.append(rule)
+        self.link(head.key, rule)
+        if info.facts and ground_fact(rule):
+            self.update_facts(head.key, info)
+        else:
+            self.dirty.add(head.key)
+
+    def remove(self, rule):
+        head = rule.head
+        if not isinstance(head, Term):
+            return
+        info = self.table.get(head.key, None)
+        if info is None:
+            return
+        info.clauses.remove(rule)
+        if not info.clauses:
+            del self.table[head.key]
+            self.dirty.discard(head.key)
+            self.touched.add(head.key)
+        elif info.facts:
+            self.update_facts(head.key, info)
+        else:
+            self.dirty.add(head.key)
+
+    def update_facts(self, key, info):
+        # у предиката из основных фактов режимы неизвестны, побочных эффектов
+        # нет, а исключающие позиции видны по числу разных ключей
+        if key in self.dirty:
+            return
+        if len(info.clauses) == 1:
+            determinism = clause_determinism(info.clauses[0], self.table)
+        else:
+            determinism = NONDET
+        stats = self.statistics.get(key)
+        exclusive = tuple(
+            pos for pos in range(info.arity)
+            if not stats.open[pos] and len(stats.keys[pos]) == stats.count
+        )
+        if determinism != info.determinism or exclusive != info.exclusive:
+            info.determinism = determinism
+            info.exclusive = exclusive
+            self.touched.add(key)
+
+    def update(self):
+        if not self.dirty and not self.touched:
+            return self.table
+        table = self.table
+        for key in self.dirty:
+            table[key].facts = facts_only(table[key])
+        affected = set()
+        stack = list(self.dirty | self.touched)
+        while stack:
+            key = stack.pop()
+            for caller in self.callers.get(key, ()):
+                if caller not in affected:
+                    affected.add(caller)
+                    stack.append(caller)
+        affected.update(self.dirty)
+        settle(table, [table[key] for key in affected if key in table])
+        self.dirty = set()
+        self.touched = set()
+        return table
+
+
+def reachable(table, key):
+    # функторы, достижимые из key через тела клауз; None - по пути есть
+    # вызов через переменную, и достижимо что угодно
+    found = set()
+    stack = [key]
+    while stack:
+        item = stack.pop()
+        if item in found:
+            continue
+        found.add(item)
+        info = table.get(item, None)
+        if info is None:
+            continue
+        for rule in info.clauses:
+            for goal in body_goals(rule.body):
+                if type(goal) is Variable:
+                    return None
+                if isinstance(goal, Term):
+                    stack.append(goal.key)
+    return frozenset(found)
+
+
+def nondeterministic(table):
+    return [info for info in table.values() if info.determinism == NONDET]
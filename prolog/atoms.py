@@ -0,0 +1,40 @@
+class AtomTable:
+    def __init__(self):
+        self.ids = {}        # имя атома -> номер
+        self.names = []      # номер -> имя атома
+        self.constants = []  # номер -> ключ (номер, 0)
+        self.functors = {}   # (номер, арность) -> ключ составного терма
+
+    def intern(self, name):
+        atom = self.ids.get(name, None)
+        if atom is None:
+            atom = len(self.names)
+            self.names.append(name)
+            self.constants.append((atom, 0))
+            self.ids[name] = atom
+        return atom
+
+    def functor(self, name, arity):
+        atom = self.intern(name)
+        if arity == 0:
+            return self.constants[atom]
+        key = self.functors.get((atom, arity), None)
+        if key is None:
+            key = (atom, arity)
+            self.functors[key] = key
+        return key
+
+    def name(self, atom):
+        return self.names[atom]
+
+    def __len__(self):
+        return len(self.names)
+
+
+atoms = AtomTable()
+
+
+def functor(pred, arity):
+    if type(pred) is str:
+        return atoms.functor(pred, arity)
+    return (pred, arity)
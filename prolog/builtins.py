@@ -1,8 +1,11 @@
 from abc import ABC, abstractmethod
 from .merge import merge_bindings
+from .hamt import EMPTY
 
 
 class BuiltinsBase(ABC):
+    __slots__ = ()
+
     @abstractmethod
     def match(self, other):
         pass
@@ -15,12 +18,14 @@ class BuiltinsBase(ABC):
     def display(self, stream_writer):
         pass
 
-    def query(self, database, bindings={}):
+    def query(self, database, bindings=EMPTY):
         self.substitute(bindings).display(database.stream_write)
         yield bindings
 
 
 class Fail:
+    __slots__ = ('name',)
+
     def __init__(self):
         self.name = 'fail'
 
@@ -38,6 +43,8 @@ class Fail:
 
 
 class Cut:
+    __slots__ = ('name',)
+
     def __init__(self):
         self.name = 'cut'
 
@@ -55,6 +62,8 @@ class Cut:
 
 
 class Write(BuiltinsBase):
+    __slots__ = ('pred', 'args')
+
     def __init__(self, *args):
         self.pred = 'write'
         self.args = list(args)
@@ -84,6 +93,8 @@ class Write(BuiltinsBase):
 
 
 class Nl(BuiltinsBase):
+    __slots__ = ('pred',)
+
     def __init__(self):
         self.pred = 'nl'
 
@@ -104,6 +115,8 @@ class Nl(BuiltinsBase):
 
 
 class Tab(BuiltinsBase):
+    __slots__ = ('pred',)
+
     def __init__(self):
         self.pred = 'tab'
 
@@ -124,6 +137,8 @@ class Tab(BuiltinsBase):
 
 
 class DatabaseOp(ABC):
+    __slots__ = ()
+
     def match(self, other):
         bindings = dict()
         if self != other:
@@ -138,7 +153,7 @@ class DatabaseOp(ABC):
     def execute(self, remove_rule):
         pass
 
-    def query(self, database, bindings={}):
+    def query(self, database, bindings=EMPTY):
         param_bound = list(self.arg.query(database))
         if param_bound:
             param_bound = param_bound[0]
@@ -153,6 +168,8 @@ class DatabaseOp(ABC):
 
 
 class Retract(DatabaseOp):
+    __slots__ = ('pred', 'arg')
+
     def __init__(self, arg):
         self.pred = 'retract'
         self.arg = arg
@@ -174,6 +191,8 @@ class Retract(DatabaseOp):
 
 
 class AssertA(DatabaseOp):
+    __slots__ = ('pred', 'arg')
+
     def __init__(self, arg):
         self.pred = 'asserta'
         self.arg = arg
@@ -195,6 +214,8 @@ class AssertA(DatabaseOp):
 
 
 class AssertZ(DatabaseOp):
+    __slots__ = ('pred', 'arg')
+
     def __init__(self, arg):
         self.pred = 'assertz'
         self.arg = arg
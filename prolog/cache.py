@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from .types import Variable, Term
+from .variant import variant_key, fresh_variant
+from .analysis import body_goals, goal_pure
+
+
+class CacheEntry:
+    __slots__ = ('answers', 'dependencies')
+
+    def __init__(self, answers, dependencies):
+        self.answers = answers
+        self.dependencies = dependencies  # функторы, достижимые из запроса
+
+
+class AnswerCache:
+    def __init__(self, max_entries=1000, max_answers=10000):
+        self.entries = OrderedDict()  # вариант запроса -> CacheEntry, в порядке использования
+        self.users = {}               # функтор -> варианты запросов, зависящих от него
+        self.max_entries = max_entries
+        self.max_answers = max_answers  # ответов в одной записи
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, query):
+        if isinstance(query, Term):
+            return variant_key(query)
+        numbering = {}
+        return ('##', variant_key(query.head, numbering), variant_key(query.body, numbering))
+
+    def dependencies(self, database, query):
+        # None - запрос кэшировать нельзя: есть побочные эффекты, вызов
+        # через переменную или таблируемый предикат. Пока таблица не
+        # завершена, вызов отдаёт только найденные к этому моменту ответы,
+        # так что вычисляемые таблицы запрещают кэширование целиком
+        if len(database.store.wild) or database.tables.stack:
+            return None
+        table = database.analysis()
+        if isinstance(query, Term):
+            goals = [query]
+            dependencies = set()
+        else:
+            goals = body_goals(query.body)
+            dependencies = {query.head.key}
+        for goal in goals:
+            if type(goal) is Variable or not goal_pure(goal, table):
+                return None
+            if isinstance(goal, Term):
+                found = database.reachable(goal.key)
+                if found is None or not found.isdisjoint(database.tables.tabled):
+                    return None
+                dependencies.update(found)
+        return dependencies
+
+    def solve(self, database, query):
+        key = self.key(query)
+        entry = self.entries.get(key, None)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            # каждый раз свои переменные: два вызова одного варианта в
+            # одной конъюнкции не должны делить свободные переменные ответа
+            for answer in entry.answers:
+                yield fresh_variant(answer)
+            return
+        dependencies = self.dependencies(database, query)
+        if dependencies is None:
+            yield from database.solve(query)
+            return
+
+        self.misses += 1
+        generation = database.store.generation
+        answers = []
+        for answer in database.solve(query):
+            if answers is not None:
+                answers.append(answer)
+                if len(answers) > self.max_answers:
+                    answers = None
+            yield answer
+        # сюда доходим, только если ответы перебраны до конца; если база
+        # менялась во время перебора, ответы могут быть уже неверны
+        if answers is not None and database.store.generation == generation and \
+           not database.tables.stack:
+            self.add(key, [fresh_variant(answer) for answer in answers], dependencies)
+
+    def add(self, key, answers, dependencies):
+        if key in self.entries:
+            self.remove(key)
+        self.entries[key] = CacheEntry(answers, dependencies)
+        for item in dependencies:
+            self.users.setdefault(item, set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        entry = self.entries.pop(key)
+        for item in entry.dependencies:
+            users = self.users[item]
+            users.discard(key)
+            if not users:
+                del self.users[item]
+
+    def invalidate(self, head):
+        if not isinstance(head, Term):
+            self.clear()  # клауза с головой-переменной подходит к любому вызову
+            return
+        for key in list(self.users.get(head.key, ())):
+            self.remove(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.users.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        return f'{len(self.entries)} entries, {self.hits} hits, {self.misses} misses'
+
+    def __repr__(self):
+        return str(self)
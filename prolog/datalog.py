@@ -0,0 +1,503 @@
+from collections import Counter
+from .types import Variable, Term
+from .analysis import body_goals
+
+
+def is_constant(arg):
+    return isinstance(arg, Term) and not arg.args
+
+
+def datalog_clause(rule):
+    # голова и цели тела - только константы и переменные, тело - только вызовы,
+    # каждая переменная головы встречается в теле
+    head = rule.head
+    if not isinstance(head, Term):
+        return False
+    body = body_goals(rule.body)
+    names = set()
+    for goal in body:
+        if type(goal) is not Term:
+            return False
+        for arg in goal.args:
+            if type(arg) is Variable:
+                names.add(arg.name)
+            elif not is_constant(arg):
+                return False
+    for arg in head.args:
+        if type(arg) is Variable:
+            if arg.name == '_' or arg.name not in names:
+                return False
+        elif not is_constant(arg):
+            return False
+    return True
+
+
+def datalog_predicates(rules):
+    clauses = {}
+    for rule in rules:
+        if not isinstance(rule.head, Term):
+            return {}
+        clauses.setdefault(rule.head.key, []).append(rule)
+
+    safe = {key for key, items in clauses.items() if all(map(datalog_clause, items))}
+    # предикат, вызывающий не-Datalog предикат, тоже исключается
+    changed = True
+    while changed:
+        changed = False
+        for key in list(safe):
+            for rule in clauses[key]:
+                if any(goal.key in clauses and goal.key not in safe
+                       for goal in body_goals(rule.body)):
+                    safe.discard(key)
+                    changed = True
+                    break
+    return {key: clauses[key] for key in safe}
+
+
+def strata(predicates):
+    # компоненты сильной связности графа вызовов (Тарьян),
+    # вызываемые компоненты идут раньше вызывающих
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+
+    def callees(key):
+        for rule in predicates[key]:
+            for goal in body_goals(rule.body):
+                if goal.key in predicates:
+                    yield goal.key
+
+    def visit(key):
+        index[key] = lowlink[key] = len(index)
+        stack.append(key)
+        on_stack.add(key)
+        for callee in callees(key):
+            if callee not in index:
+                visit(callee)
+                lowlink[key] = min(lowlink[key], lowlink[callee])
+            elif callee in on_stack:
+                lowlink[key] = min(lowlink[key], index[callee])
+        if lowlink[key] == index[key]:
+            component = []
+            while True:
+                item = stack.pop()
+                on_stack.discard(item)
+                component.append(item)
+                if item == key:
+                    break
+            components.append(component)
+
+    for key in predicates:
+        if key not in index:
+            visit(key)
+    return components
+
+
+class Relation:
+    __slots__ = ('tuples', 'indexes')
+
+    def __init__(self):
+        self.tuples = {}    # кортежи аргументов в порядке вывода (словарь как множество)
+        self.indexes = {}   # позиции -> значения в них -> кортежи
+
+    def add(self, row):
+        if row in self.tuples:
+            return False
+        self.tuples[row] = None
+        for positions, index in self.indexes.items():
+            key = tuple(row[pos] for pos in positions)
+            index.setdefault(key, {})[row] = None
+        return True
+
+    def discard(self, row):
+        if row not in self.tuples:
+            return False
+        del self.tuples[row]
+        for positions, index in self.indexes.items():
+            key = tuple(row[pos] for pos in positions)
+            bucket = index[key]
+            del bucket[row]
+            if not bucket:
+                del index[key]
+        return True
+
+    def lookup(self, positions, key):
+        if not positions:
+            return self.tuples
+        index = self.indexes.get(positions, None)
+        if index is None:
+            index = {}
+            for row in self.tuples:
+                index.setdefault(tuple(row[pos] for pos in positions), {})[row] = None
+            self.indexes[positions] = index
+        return index.get(key, ())
+
+    def __contains__(self, row):
+        return row in self.tuples
+
+    def __iter__(self):
+        return iter(self.tuples)
+
+    def __len__(self):
+        return len(self.tuples)
+
+
+def relation_of(rows):
+    relation = Relation()
+    for row in rows:
+        relation.add(row)
+    return relation
+
+
+EMPTY_RELATION = Relation()
+
+
+class Step:
+    __slots__ = ('key', 'positions', 'inputs', 'outputs', 'checks')
+
+    def __init__(self, key, positions, inputs, outputs, checks):
+        self.key = key
+        self.positions = positions  # связанные позиции аргументов
+        self.inputs = inputs        # для каждой: константа или номер слота
+        self.outputs = outputs      # (позиция, слот) для новых переменных
+        self.checks = checks        # (позиция, слот) для повторов новой переменной
+
+
+def bound_first(goals, bound, sizes):
+    # жадно: следующей идёт цель с наибольшим числом известных аргументов,
+    # при равенстве - с меньшим отношением
+    def known(goal):
+        return (
+            sum(type(arg) is not Variable or arg.name in bound for arg in goal.args),
+            -sizes(goal.key)
+        )
+
+    goals = list(goals)
+    ordered = []
+    while goals:
+        goal = max(goals, key=known)
+        goals.remove(goal)
+        ordered.append(goal)
+        bound.update(
+            arg.name for arg in goal.args if type(arg) is Variable and arg.name != '_'
+        )
+    return ordered
+
+
+class DatalogRule:
+    def __init__(self, rule, sizes=None):
+        slots = {}
+        bound = set()
+        if sizes is not None:
+            # переменные головы известны заранее: проверка, выводится ли кортеж
+            for arg in rule.head.args:
+                if type(arg) is Variable and arg.name not in slots:
+                    slots[arg.name] = len(slots)
+            bound.update(slots)
+            goals = bound_first(body_goals(rule.body), set(bound), sizes)
+        else:
+            goals = body_goals(rule.body)
+        self.steps = []
+        for goal in goals:
+            positions = []
+            inputs = []
+            outputs = []
+            checks = []
+            for pos, arg in enumerate(goal.args):
+                if type(arg) is not Variable:
+                    positions.append(pos)
+                    inputs.append(arg)
+                elif arg.name == '_':
+                    continue
+                elif arg.name in bound:
+                    positions.append(pos)
+                    inputs.append(slots[arg.name])
+                elif arg.name in slots:
+                    checks.append((pos, slots[arg.name]))  # повтор в этой же цели
+                else:
+                    slots[arg.name] = len(slots)
+                    outputs.append((pos, slots[arg.name]))
+            bound.update(slots)
+            self.steps.append(Step(goal.key, tuple(positions), inputs, outputs, checks))
+        self.key = rule.head.key
+        self.head = [slots[arg.name] if type(arg) is Variable else arg for arg in rule.head.args]
+        self.size = len(slots)
+
+    def seed(self, values):
+        row = [None] * self.size
+        for item, value in zip(self.head, values):
+            if type(item) is not int:
+                if item != value:
+                    return None
+            elif row[item] is None:
+                row[item] = value
+            elif row[item] != value:
+                return None
+        return row
+
+    def derives(self, values, sources):
+        row = self.seed(values)
+        return row is not None and next(self.evaluate(sources, row), None) is not None
+
+    def evaluate(self, sources, seed=None):
+        # sources[i] - отношение для i-й цели тела; соединение слева направо
+        rows = [[None] * self.size if seed is None else seed]
+        for step, relation in zip(self.steps, sources):
+            joined = []
+            for row in rows:
+                key = tuple(row[item] if type(item) is int else item for item in step.inputs)
+                for found in relation.lookup(step.positions, key):
+                    new = row[:]
+                    for pos, slot in step.outputs:
+                        new[slot] = found[pos]
+                    if all(new[slot] == found[pos] for pos, slot in step.checks):
+                        joined.append(new)
+            rows = joined
+            if not rows:
+                return
+        for row in rows:
+            yield tuple(row[item] if type(item) is int else item for item in self.head)
+
+
+def answers(relation, goal, name=None):
+    positions = []
+    key = []
+    first = {}
+    repeats = []  # (позиция, позиция первого вхождения той же переменной)
+    for pos, arg in enumerate(goal.args):
+        if is_constant(arg):
+            positions.append(pos)
+            key.append(arg)
+        elif type(arg) is not Variable:
+            return  # составной терм с константами отношения не совпадёт
+        elif id(arg) in first:
+            repeats.append((pos, first[id(arg)]))
+        else:
+            first[id(arg)] = pos
+    if name is None:
+        name = goal.pred
+    for row in relation.lookup(tuple(positions), tuple(key)):
+        if all(row[pos] == row[other] for pos, other in repeats):
+            yield Term(name, *row)
+
+
+def fact_relations(predicates):
+    # предикаты из одних фактов: их отношения общие для всех вычислений
+    base = {}
+    for key, rules in predicates.items():
+        if not any(body_goals(rule.body) for rule in rules):
+            relation = Relation()
+            for rule in rules:
+                relation.add(rule.head.args)
+            base[key] = relation
+    return base
+
+
+class Extension:
+    def __init__(self, predicates, base=None):
+        self.predicates = predicates                # функтор -> клаузы
+        self.base = {} if base is None else base    # готовые отношения фактов
+        self.relations = {
+            key: Relation() for key in predicates if key not in self.base
+        }
+        self.facts = {key: set() for key in self.relations}  # явные факты
+        self.components = []  # (функторы страты, правила, рекурсивные правила)
+        self.checks = {}      # функтор -> правила с известной головой
+        for component in strata(predicates):
+            if any(key in self.relations for key in component):
+                self.evaluate(component)
+
+    def relation(self, key):
+        relation = self.relations.get(key, None)
+        if relation is None:
+            return self.base.get(key, EMPTY_RELATION)
+        return relation
+
+    def spread(self, rules, changes):
+        # выводы, в которых хотя бы одна цель берёт кортеж из changes
+        derived = []
+        for rule in rules:
+            for i, step in enumerate(rule.steps):
+                change = changes.get(step.key, None)
+                if not change:
+                    continue
+                sources = [
+                    change if j == i else self.relation(other.key)
+                    for j, other in enumerate(rule.steps)
+                ]
+                derived.extend((rule.key, row) for row in rule.evaluate(sources))
+        return derived
+
+    def closure(self, members, rules, delta, accept):
+        # полунаивная неподвижная точка по новым кортежам страты
+        while any(delta.values()):
+            changes = {key: relation_of(rows) for key, rows in delta.items() if rows}
+            delta = {key: [] for key in members}
+            for key, row in self.spread(rules, changes):
+                if accept(key, row):
+                    delta[key].append(row)
+
+    def evaluate(self, component):
+        members = set(component)
+        rules = []
+        for key in component:
+            for rule in self.predicates[key]:
+                if body_goals(rule.body):
+                    rules.append(DatalogRule(rule))
+                else:
+                    self.facts[key].add(rule.head.args)
+                    self.relations[key].add(rule.head.args)
+        recursive = [rule for rule in rules if any(step.key in members for step in rule.steps)]
+        self.components.append((members, rules, recursive))
+
+        delta = {key: list(self.relations[key]) for key in component}
+        for rule in rules:
+            if rule not in recursive:
+                sources = [self.relation(step.key) for step in rule.steps]
+                relation = self.relations[rule.key]
+                for row in rule.evaluate(sources):
+                    if relation.add(row):
+                        delta[rule.key].append(row)
+        self.closure(members, recursive, delta, lambda key, row: self.relations[key].add(row))
+
+    def added(self, changes):
+        # changes: функтор -> Relation кортежей, уже внесённых в отношения;
+        # новые выводы распространяются по стратам снизу вверх
+        for members, rules, recursive in self.components:
+            fresh = {key: [] for key in members}
+
+            def accept(key, row):
+                if self.relations[key].add(row):
+                    fresh[key].append(row)
+                    return True
+                return False
+
+            delta = {key: [] for key in members}
+            for key, row in self.spread(rules, changes):
+                if accept(key, row):
+                    delta[key].append(row)
+            self.closure(members, recursive, delta, accept)
+            for key, rows in fresh.items():
+                if not rows:
+                    continue
+                change = changes.setdefault(key, Relation())
+                for row in rows:
+                    change.add(row)
+
+    def removed(self, changes):
+        # удаление и повторный вывод (DRed): сначала по старым отношениям
+        # помечаются все кортежи, у которых мог пропасть вывод, затем они
+        # удаляются, и возвращаются те, что выводятся из оставшихся
+        for members, rules, recursive in self.components:
+            def accept(key, row):
+                return row in self.relations[key] and \
+                    changes.setdefault(key, Relation()).add(row)
+
+            delta = {key: [] for key in members}
+            for key, row in self.spread(rules, changes):
+                if accept(key, row):
+                    delta[key].append(row)
+            self.closure(members, recursive, delta, accept)
+
+        for key, rows in changes.items():
+            relation = self.relation(key)
+            for row in rows:
+                relation.discard(row)
+
+        restored = {}
+        for key, rows in changes.items():
+            if key not in self.relations:
+                continue
+            for row in rows:
+                if row in self.facts[key] or any(
+                    rule.derives(row, [self.relation(step.key) for step in rule.steps])
+                    for rule in self.seeded(key)
+                ):
+                    self.relations[key].add(row)
+                    restored.setdefault(key, Relation()).add(row)
+        if restored:
+            self.added(restored)
+
+    def seeded(self, key):
+        rules = self.checks.get(key, None)
+        if rules is None:
+            rules = [
+                DatalogRule(rule, sizes=lambda key: len(self.relation(key)))
+                for rule in self.predicates[key] if body_goals(rule.body)
+            ]
+            self.checks[key] = rules
+        return rules
+
+    def answers(self, goal, name=None):
+        return answers(self.relation(goal.key), goal, name)
+
+
+class DatalogProgram:
+    def __init__(self, rules):
+        self.predicates = datalog_predicates(rules)
+        self.base = fact_relations(self.predicates)
+        self.full = None  # полное вычисление, строится по первому запросу
+        self.counts = {}  # функтор -> кортеж -> число одинаковых фактов
+
+    def extension(self):
+        if self.full is None:
+            self.full = Extension(self.predicates, self.base)
+        return self.full
+
+    def base_fact(self, rule):
+        # поддерживаются только изменения фактов базовых предикатов,
+        # остальное требует построить программу заново
+        head = rule.head
+        if not isinstance(head, Term) or head.key not in self.base or body_goals(rule.body):
+            return None
+        if not all(is_constant(arg) for arg in head.args):
+            return None
+        return head.key
+
+    def multiplicity(self, key):
+        counts = self.counts.get(key, None)
+        if counts is None:
+            counts = Counter(rule.head.args for rule in self.predicates[key])
+            self.counts[key] = counts
+        return counts
+
+    def insert(self, rule, first=False):
+        key = self.base_fact(rule)
+        if key is None:
+            return False
+        counts = self.multiplicity(key)
+        if first:
+            self.predicates[key].insert(0, rule)
+        else:
+            self.predicates[key].append(rule)
+        row = rule.head.args
+        counts[row] += 1
+        if counts[row] == 1:
+            self.base[key].add(row)
+            if self.full is not None:
+                self.full.added({key: relation_of([row])})
+        return True
+
+    def remove(self, rule):
+        key = self.base_fact(rule)
+        if key is None:
+            return False
+        rules = self.predicates[key]
+        for i, other in enumerate(rules):
+            if other is rule:
+                break
+        else:
+            return False
+        counts = self.multiplicity(key)
+        del rules[i]
+        row = rule.head.args
+        counts[row] -= 1
+        if counts[row] == 0:
+            del counts[row]
+            if self.full is None:
+                self.base[key].discard(row)
+            else:
+                self.full.removed({key: relation_of([row])})
+        return True
@@ -0,0 +1,28 @@
+from .types import Variable
+
+
+class Frame:
+    __slots__ = ('variables', 'values', 'bindings')
+
+    def __init__(self, variables, bindings=None):
+        self.variables = variables               # переменные клаузы по номерам
+        self.values = [None] * len(variables)    # их копии для этой активации
+        self.bindings = {} if bindings is None else bindings
+
+    def rename(self, variable):
+        index = variable.index
+        if index is None or index >= len(self.variables) or \
+           self.variables[index] is not variable:
+            return variable
+        value = self.values[index]
+        if value is None:
+            value = Variable(variable.name)
+            self.values[index] = value
+        return value
+
+    def get(self, key, default=None):
+        if isinstance(key, Variable) and key.index is not None:
+            value = self.rename(key)
+            if value is not key:
+                return value
+        return self.bindings.get(key, default)
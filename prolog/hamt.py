@@ -0,0 +1,184 @@
+BITS = 5
+MASK = (1 << BITS) - 1
+SMALL = 8  # до стольких пар храним плоским кортежем, без дерева
+
+
+class Node:
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap, entries):
+        self.bitmap = bitmap    # какие из 32 ветвей заняты
+        self.entries = entries  # кортеж: листья (хеш, ключ, значение) и поддеревья
+
+
+class Collision:
+    __slots__ = ('hash', 'entries')
+
+    def __init__(self, hash, entries):
+        self.hash = hash        # общий хеш всех ключей
+        self.entries = entries  # кортеж листьев (хеш, ключ, значение)
+
+
+def same_key(left, right):
+    return left is right or left == right
+
+
+def pair(leaf1, leaf2, shift):
+    if leaf1[0] == leaf2[0]:
+        return Collision(leaf1[0], (leaf1, leaf2))
+    bit1 = (leaf1[0] >> shift) & MASK
+    bit2 = (leaf2[0] >> shift) & MASK
+    if bit1 == bit2:
+        return Node(1 << bit1, (pair(leaf1, leaf2, shift + BITS),))
+    if bit1 < bit2:
+        return Node((1 << bit1) | (1 << bit2), (leaf1, leaf2))
+    return Node((1 << bit1) | (1 << bit2), (leaf2, leaf1))
+
+
+def lookup(node, key, hash, default):
+    shift = 0
+    while node is not None:
+        if type(node) is Collision:
+            for leaf in node.entries:
+                if same_key(leaf[1], key):
+                    return leaf[2]
+            return default
+        bit = 1 << ((hash >> shift) & MASK)
+        if not node.bitmap & bit:
+            return default
+        entry = node.entries[(node.bitmap & (bit - 1)).bit_count()]
+        if type(entry) is tuple:
+            if same_key(entry[1], key):
+                return entry[2]
+            return default
+        node = entry
+        shift += BITS
+    return default
+
+
+def insert(node, leaf, shift):
+    # возвращает (новый узел, добавлен ли новый ключ); старый узел не меняется
+    if node is None:
+        return Node(1 << ((leaf[0] >> shift) & MASK), (leaf,)), True
+
+    if type(node) is Collision:
+        if node.hash != leaf[0]:
+            # поднимаем коллизию на уровень выше и вставляем рядом
+            wrapper = Node(1 << ((node.hash >> shift) & MASK), (node,))
+            return insert(wrapper, leaf, shift)
+        entries = node.entries
+        for i, item in enumerate(entries):
+            if same_key(item[1], leaf[1]):
+                return Collision(node.hash, entries[:i] + (leaf,) + entries[i + 1:]), False
+        return Collision(node.hash, entries + (leaf,)), True
+
+    bit = 1 << ((leaf[0] >> shift) & MASK)
+    index = (node.bitmap & (bit - 1)).bit_count()
+    entries = node.entries
+    if not node.bitmap & bit:
+        return Node(node.bitmap | bit, entries[:index] + (leaf,) + entries[index:]), True
+
+    entry = entries[index]
+    added = False
+    if type(entry) is tuple:
+        if same_key(entry[1], leaf[1]):
+            if entry[2] is leaf[2]:
+                return node, False
+            child = leaf
+        else:
+            child = pair(entry, leaf, shift + BITS)
+            added = True
+    else:
+        child, added = insert(entry, leaf, shift + BITS)
+        if child is entry:
+            return node, False
+    return Node(node.bitmap, entries[:index] + (child,) + entries[index + 1:]), added
+
+
+def leaves(node):
+    if node is None:
+        return
+    for entry in node.entries:
+        if type(entry) is tuple:
+            yield entry
+        else:
+            yield from leaves(entry)
+
+
+class Bindings:
+    __slots__ = ('root', 'size')
+
+    def __init__(self, root=(), size=0):
+        self.root = root  # кортеж пар для малых отображений, иначе корень дерева
+        self.size = size
+
+    def get(self, key, default=None):
+        root = self.root
+        if type(root) is tuple:
+            for item in root:
+                if item[0] is key or item[0] == key:
+                    return item[1]
+            return default
+        return lookup(root, key, hash(key), default)
+
+    def set(self, key, value):
+        root = self.root
+        if type(root) is tuple:
+            for i, item in enumerate(root):
+                if item[0] is key or item[0] == key:
+                    if item[1] is value:
+                        return self
+                    return Bindings(root[:i] + ((key, value),) + root[i + 1:], self.size)
+            if len(root) < SMALL:
+                return Bindings(root + ((key, value),), self.size + 1)
+            tree = None
+            for item in root:
+                tree, _ = insert(tree, (hash(item[0]), item[0], item[1]), 0)
+            root = tree
+        root, added = insert(root, (hash(key), key, value), 0)
+        if root is self.root:
+            return self
+        return Bindings(root, self.size + added)
+
+    def update(self, items):
+        bindings = self
+        for key, value in items:
+            bindings = bindings.set(key, value)
+        return bindings
+
+    def items(self):
+        if type(self.root) is tuple:
+            return iter(self.root)
+        return ((leaf[1], leaf[2]) for leaf in leaves(self.root))
+
+    def keys(self):
+        return (key for key, _ in self.items())
+
+    def values(self):
+        return (value for _, value in self.items())
+
+    def __getitem__(self, key):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+
+    def __iter__(self):
+        return self.keys()
+
+    def __len__(self):
+        return self.size
+
+    def __str__(self):
+        items = ', '.join(f'{key}: {value}' for key, value in self.items())
+        return f'{{{items}}}'
+
+    def __repr__(self):
+        return str(self)
+
+
+MISSING = object()
+EMPTY = Bindings()
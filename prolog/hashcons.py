@@ -0,0 +1,44 @@
+from .types import Term, Dot, Bar, make_number
+
+
+class TermPool:
+    def __init__(self):
+        self.terms = {}  # терм -> его единственный экземпляр
+
+    def share(self, term):
+        if not term.ground:
+            return term
+        return self.terms.setdefault(term, term)
+
+    def term(self, pred, *args):
+        return self.share(Term(pred, *map(self.intern, args)))
+
+    def number(self, value):
+        return self.share(make_number(value))
+
+    def list(self, items):
+        return self.share(Dot(tuple(map(self.intern, items))))
+
+    def intern(self, term):
+        if not getattr(term, 'ground', False):
+            if isinstance(term, Bar):
+                return Bar(self.intern(term.head), self.intern(term.tail))
+            if type(term) is Term:
+                return Term(term.pred, *map(self.intern, term.args))
+            if isinstance(term, Dot):
+                return Dot(tuple(map(self.intern, term)))
+            return term
+        canonical = self.terms.get(term, None)
+        if canonical is not None:
+            return canonical
+        if isinstance(term, Dot):
+            return self.list(term)
+        if type(term) is Term:
+            return self.term(term.pred, *term.args)
+        return self.share(term)
+
+    def clear(self):
+        self.terms.clear()
+
+    def __len__(self):
+        return len(self.terms)
@@ -0,0 +1,155 @@
+from .types import Term
+from .matcher import compile_head
+
+
+def arg_key(arg):
+    if isinstance(arg, Term):
+        return arg.key
+    return None
+
+
+def goal_keys(goal):
+    return tuple(map(arg_key, goal.args))
+
+
+class Clause:
+    __slots__ = ('rule', 'born', 'died', 'match')
+
+    def __init__(self, rule, born):
+        self.rule = rule
+        self.born = born   # поколение, в котором клауза добавлена
+        self.died = None   # поколение, в котором клауза удалена
+        self.match = None  # скомпилированное сопоставление головы
+
+    def visible(self, generation):
+        return self.born <= generation and \
+            (self.died is None or generation < self.died)
+
+    def matcher(self):
+        # голова компилируется при первой попытке, а не при загрузке
+        if self.match is None:
+            self.match = compile_head(self.rule.head)
+        return self.match
+
+
+class ClauseSeq:
+    def __init__(self, items=()):
+        self.front = []          # asserta, в обратном порядке
+        self.back = list(items)  # исходные клаузы и assertz
+
+    def push_front(self, item):
+        self.front.append(item)
+
+    def push_back(self, item):
+        self.back.append(item)
+
+    def copy(self):
+        return ClauseSeq(self)
+
+    def __len__(self):
+        return len(self.front) + len(self.back)
+
+    def __iter__(self):
+        front = self.front
+        back = self.back
+        for i in range(len(front) - 1, -1, -1):
+            yield front[i]
+        for i in range(len(back)):
+            yield back[i]
+
+
+class PredicateIndex:
+    def __init__(self, clauses=()):
+        self.clauses = ClauseSeq(clauses)  # клаузы предиката по порядку
+        self.positions = {}                # позиция аргумента -> (корзины, без ключа)
+        self.dead = 0                      # удалённые, но ещё не вычищенные клаузы
+        self.version = 0                   # растёт при каждом изменении набора клауз
+        self.appended = None               # клауза, если последним изменением был add_last
+
+    def add_first(self, clause):
+        self.version += 1
+        self.appended = None
+        self.clauses.push_front(clause)
+        for pos, (buckets, unindexed) in self.positions.items():
+            key = arg_key(clause.rule.head.args[pos])
+            if key is None:
+                unindexed.push_front(clause)
+                for bucket in buckets.values():
+                    bucket.push_front(clause)
+            else:
+                self.bucket(buckets, unindexed, key).push_front(clause)
+
+    def add_last(self, clause):
+        self.version += 1
+        self.appended = clause
+        self.clauses.push_back(clause)
+        for pos, (buckets, unindexed) in self.positions.items():
+            key = arg_key(clause.rule.head.args[pos])
+            if key is None:
+                unindexed.push_back(clause)
+                for bucket in buckets.values():
+                    bucket.push_back(clause)
+            else:
+                self.bucket(buckets, unindexed, key).push_back(clause)
+
+    def remove(self, clause, generation):
+        clause.died = generation
+        self.version += 1
+        self.appended = None
+        self.dead += 1
+        if self.dead * 2 > len(self.clauses):
+            self.compact()
+
+    def compact(self):
+        # старые списки остаются у итераторов, начатых до вычистки
+        self.clauses = ClauseSeq(
+            clause for clause in self.clauses if clause.died is None
+        )
+        self.positions = {}
+        self.dead = 0
+
+    def bucket(self, buckets, unindexed, key):
+        bucket = buckets.get(key, None)
+        if bucket is None:
+            bucket = unindexed.copy()
+            buckets[key] = bucket
+        return bucket
+
+    def position(self, pos):
+        entry = self.positions.get(pos, None)
+        if entry is not None:
+            return entry
+
+        buckets = {}
+        unindexed = ClauseSeq()
+        for clause in self.clauses:
+            key = arg_key(clause.rule.head.args[pos])
+            if key is None:
+                for bucket in buckets.values():
+                    bucket.push_back(clause)
+                unindexed.push_back(clause)
+            else:
+                self.bucket(buckets, unindexed, key).push_back(clause)
+
+        entry = (buckets, unindexed)
+        self.positions[pos] = entry
+        return entry
+
+    def select(self, keys):
+        best = self.clauses
+        for pos, key in enumerate(keys):
+            if key is None:
+                continue
+            buckets, unindexed = self.position(pos)
+            candidates = buckets.get(key, unindexed)
+            if len(candidates) < len(best):
+                best = candidates
+                if not best:
+                    break
+        return best
+
+    def __len__(self):
+        return len(self.clauses) - self.dead
+
+    def __iter__(self):
+        return iter(self.clauses)
@@ -1,12 +1,28 @@
 import io
-from .types import Variable, Term, merge_bindings, Arithmetic, Logic, FALSE, TRUE, CUT
+from weakref import WeakKeyDictionary
+from .types import Variable, Term, merge_bindings, Arithmetic, Logic, FALSE, TRUE
 from .builtins import Write, Nl, Tab, Fail, Cut, Retract, AssertA, AssertZ
+from .store import ClauseStore
+from .frame import Frame
+from .hamt import EMPTY
+from .variant import term_variables
+from .index import Clause
+from .tabling import TableSpace
+from .analysis import Analysis, body_goals, reachable
+from .join import fact_run, join
+from .planner import plan, shape
+from .datalog import DatalogProgram
+from .magic import query as datalog_query
+from .cache import AnswerCache
 
 
 class Rule:
-    def __init__(self, head, body):
+    __slots__ = ('head', 'body', 'variables', '__weakref__')
+
+    def __init__(self, head, body, variables=()):
         self.head = head
         self.body = body
+        self.variables = variables  # переменные клаузы по номерам, для переименования
 
     def __str__(self):
         return f'{self.head}{self.body}'
@@ -15,7 +31,63 @@ class Rule:
         return str(self)
 
 
+class Directive:
+    def __init__(self, name, *args):
+        self.name = name
+        self.args = list(args)
+
+    def __str__(self):
+        args = ', '.join(f'{pred}/{arity}' for pred, arity in self.args)
+        return f':- {self.name} {args}'
+
+    def __repr__(self):
+        return str(self)
+
+
+def solve_arithmetic(arithmetic, bindings):
+    value = arithmetic.evaluate()
+    target = arithmetic.var
+    if isinstance(target, Variable):
+        return merge_bindings({target: value}, bindings)
+    if target.match(value) is None:
+        return None
+    return bindings
+
+
+def clause_rule(entry):
+    # переменные добавляемой клаузы нумеруются так же, как при разборе
+    variables = term_variables(entry)
+    if not variables:
+        return Rule(entry, TRUE())
+    numbered = {var: Variable(var.name, index) for index, var in enumerate(variables)}
+    return Rule(entry.substitute(numbered), TRUE(), tuple(numbered.values()))
+
+
+class CutBarrier:
+    __slots__ = ('alternatives',)
+
+    def __init__(self, alternatives):
+        self.alternatives = alternatives  # ещё не опробованные клаузы вызова
+
+    def cut(self):
+        self.alternatives.close()
+
+
+def remaining(clause, clauses):
+    yield clause
+    yield from clauses
+
+
+def prune(choicepoints):
+    # отсечение: закрываем генераторы альтернатив, освобождая их привязки
+    for choicepoint in choicepoints:
+        choicepoint[3].close()
+    choicepoints.clear()
+
+
 class Conjunction(Term):
+    __slots__ = ()
+
     def __init__(self, args):
         super().__init__(None, *args)
 
@@ -43,48 +115,74 @@ class Conjunction(Term):
             return True
         return False
 
-    def query(self, runtime):
-        def solutions(index, bindings):
-            if index >= len(self.args):
-                yield self.substitute(bindings)
-            else:
-                arg = self.args[index]
+    def query(self, runtime, barrier=None, source=None):
+        args = runtime.plan(self.args, source) if runtime.reorder else self.args
+        last = len(args)
+        choicepoints = []  # (номер цели, цель, привязки до неё, её решения)
+        index, bindings = 0, EMPTY
+        while True:
+            # вперёд, пока цели выполняются детерминированно
+            while bindings is not None:
+                if index == last:
+                    yield self.substitute(bindings)
+                    break
+                arg = args[index]
                 if self.check_cut(arg):
-                    for item in runtime.execute(arg.substitute(bindings)):
-                        unified = merge_bindings(
-                            arg.match(item),
-                            bindings
-                        )
-                        if unified is not None:
-                            yield from solutions(index + 1, unified)
-                            yield CUT()
-                if self.check_fail(arg):
+                    prune(choicepoints)
+                    if barrier is not None:
+                        barrier.cut()
+                elif self.check_fail(arg):
                     yield FALSE()
-                elif self.check_builtin(arg):
-                    _ = list(arg.query(runtime, bindings))
-                    yield from solutions(index + 1, bindings)
-                elif self.check_db_builtin(arg):
+                    break
+                elif self.check_builtin(arg) or self.check_db_builtin(arg):
                     _ = list(arg.query(runtime, bindings))
-                    yield from solutions(index + 1, bindings)
                 elif isinstance(arg, Arithmetic):
-                    val = arg.substitute(bindings).evaluate()
-                    unified = merge_bindings(
-                        {arg.var: val},
-                        bindings
-                    )
-                    yield from solutions(index + 1, unified)
+                    bindings = solve_arithmetic(arg.substitute(bindings), bindings)
+                    if bindings is None:
+                        break
                 elif isinstance(arg, Logic):
-                    yield arg.substitute(bindings).evaluate()
+                    result = arg.substitute(bindings).evaluate()
+                    if not isinstance(result, TRUE):
+                        yield result
+                        break
                 else:
-                    for item in runtime.execute(arg.substitute(bindings)):
-                        unified = merge_bindings(
-                            arg.match(item),
-                            bindings
-                        )
-                        if unified is not None:
-                            yield from solutions(index + 1, unified)
+                    run = runtime.fact_run(args, index)
+                    if run:
+                        # цепочка фактов с общими переменными - хеш-соединение
+                        goals = [goal.substitute(bindings) for goal in args[index:index + run]]
+                        solutions = join(runtime.store, goals, bindings)
+                        choicepoints.append((index + run - 1, None, None, solutions))
+                        break
+                    goal = arg.substitute(bindings)
+                    if not runtime.deterministic(goal):
+                        choicepoints.append((index, arg, bindings, runtime.execute(goal)))
+                        break
+                    # не больше одного решения: точка выбора не нужна
+                    item = runtime.first(goal)
+                    if item is None:
+                        break
+                    bindings = merge_bindings(arg.match(item), bindings)
+                    if bindings is None:
+                        break
+                index += 1
 
-        yield from solutions(0, {})
+            # назад: следующее решение последней точки выбора
+            bindings = None
+            while choicepoints:
+                index, arg, previous, solutions = choicepoints[-1]
+                for item in solutions:
+                    if arg is None:
+                        bindings = item  # соединение отдаёт готовые привязки
+                        break
+                    bindings = merge_bindings(arg.match(item), previous)
+                    if bindings is not None:
+                        break
+                if bindings is not None:
+                    index += 1
+                    break
+                choicepoints.pop()
+            else:
+                return
 
     def substitute(self, bindings):
         return Conjunction(
@@ -96,11 +194,31 @@ class Conjunction(Term):
 
 
 class Database:
-    def __init__(self, rules):
-        self.rules = rules
+    def __init__(self, rules, max_table_answers=100000, engine=None, reorder=False,
+                 datalog=False, cache_size=0):
+        self.tables = TableSpace(max_table_answers)
+        clauses = []
+        for rule in rules:
+            if isinstance(rule, Directive):
+                self.directive(rule)
+            else:
+                clauses.append(rule)
+        self.store = ClauseStore(clauses)
+        self.engine = None if engine is None else engine(self)
+        self.analysed = None  # Analysis, строится при первом обращении
+        self.reached = (None, {})  # (поколение, функтор -> достижимые функторы)
+        self.reorder = reorder  # переставлять цели-факты тела по статистике
+        self.plans = WeakKeyDictionary()  # клауза -> (поколение, свободные аргументы -> план)
+        self.datalog = datalog  # Datalog-предикаты вычислять снизу вверх
+        self.materialized = None  # (поколение, Datalog-часть программы)
+        self.cache = AnswerCache(cache_size) if cache_size else None  # ответы на запросы
         self.stream = io.StringIO()  # служит для вывода
         self.stream_pos = 0          # позиция курсора
 
+    @property
+    def rules(self):
+        return list(self.store)
+
     def __del__(self):
         self.stream.close()
 
@@ -118,78 +236,223 @@ class Database:
         self.stream.truncate(0)
         self.stream_pos = 0
 
+    def directive(self, directive):
+        if directive.name == 'table':
+            for pred, arity in directive.args:
+                self.tables.table(pred, arity)
+        else:
+            raise Exception(f'Unknown directive {directive.name}')
+
     def insert_rule_left(self, entry):
         if isinstance(entry, Term):
-            entry = Rule(entry, TRUE())
-        for i, item in enumerate(self.rules):
-            if entry.head.pred == item.head.pred:
-                self.rules.insert(i, entry)
-                return
-        self.rules.append(entry)
+            entry = clause_rule(entry)
+        self.store.add_first(entry)
+        if self.analysed is not None:
+            self.analysed.insert(entry, first=True)
+        self.forget(entry)
+        self.maintain(lambda program: program.insert(entry, first=True))
 
     def insert_rule_right(self, entry):
         if isinstance(entry, Term):
-            entry = Rule(entry, TRUE())
-        last_index = -1
-        for i, item in enumerate(self.rules):
-            if entry.head.pred == item.head.pred:
-                last_index = i
-
-        if last_index == -1:
-            self.rules.append(entry)
-        else:
-            self.rules.insert(last_index+1, entry)
+            entry = clause_rule(entry)
+        self.store.add_last(entry)
+        if self.analysed is not None:
+            self.analysed.insert(entry)
+        self.forget(entry)
+        self.maintain(lambda program: program.insert(entry))
 
     def remove_rule(self, rule):
         if isinstance(rule, Term):
             rule = Rule(rule, TRUE())
-        for i, item in enumerate(self.rules):
-            if rule.head.pred == item.head.pred and \
-               len(rule.head.args) == len(item.head.args) and \
-               all([
-                   x.pred == y.pred if isinstance(x, Term) and isinstance(y, Term)
-                   else x.name == y.name if isinstance(x, Variable) and isinstance(y, Variable)
-                   else False
-                   for x, y in zip(rule.head.args, item.head.args)
-                    ]):
-                self.rules.pop(i)
-                break
-
-    def all_rules(self, query):
-        rules = self.rules[:]
+        removed = self.store.remove(rule)
+        if removed is not None:
+            if self.analysed is not None:
+                self.analysed.remove(removed)
+            self.forget(removed)
+            self.maintain(lambda program: program.remove(removed))
+
+    def discard_rule(self, rule):
+        # удаление именно этой клаузы, как его делают движки при retract
+        if self.store.discard(rule):
+            if self.analysed is not None:
+                self.analysed.remove(rule)
+            self.forget(rule)
+            self.maintain(lambda program: program.remove(rule))
+            return True
+        return False
+
+    def forget(self, rule):
+        if self.cache is not None:
+            self.cache.invalidate(rule.head)
+
+    def maintain(self, update):
+        # материализованная Datalog-часть обновляется по изменению, а не
+        # строится заново; если изменение ей не по силам - сбрасывается
+        if self.materialized is None:
+            return
+        if self.materialized[0] == self.store.generation - 1 and update(self.materialized[1]):
+            self.materialized = (self.store.generation, self.materialized[1])
+        else:
+            self.materialized = None
+
+    def all_rules(self, query, goal=None):
+        return (clause.rule for clause in self.all_clauses(query, goal))
+
+    def all_clauses(self, query, goal=None):
+        if isinstance(goal, Term):
+            clauses = self.store.select_clauses(goal)
+        else:
+            clauses = self.store.visible_clauses()
+        generation = self.store.generation
+        yield from clauses
         if isinstance(query, Rule):
-            return rules + [query]
-        return rules
+            yield Clause(query, generation)
+
+    def analysis(self):
+        if self.analysed is None:
+            self.analysed = Analysis(self.store.visible(), self.store.statistics)
+        return self.analysed.update()
+
+    def reachable(self, key):
+        generation = self.store.generation
+        if self.reached[0] != generation:
+            self.reached = (generation, {})
+        known = self.reached[1]
+        if key not in known:
+            known[key] = reachable(self.analysis(), key)
+        return known[key]
+
+    def deterministic(self, goal):
+        if not isinstance(goal, Term) or len(self.store.wild) or \
+           self.tables.is_tabled(goal) or self.bottom_up(goal):
+            return False
+        info = self.analysis().get(goal.key, None)
+        return info is not None and info.deterministic(goal)
+
+    def datalog_program(self):
+        generation = self.store.generation
+        if self.materialized is None or self.materialized[0] != generation:
+            self.materialized = (generation, DatalogProgram(list(self.store.visible())))
+        return self.materialized[1]
+
+    def bottom_up(self, goal):
+        return self.datalog and isinstance(goal, Term) and \
+            goal.key in self.datalog_program().predicates
+
+    @property
+    def statistics(self):
+        return self.store.statistics
+
+    def plan(self, goals, source=None):
+        # план запоминается по клаузе, поколению базы и свободным аргументам
+        # вызова, а не считается заново при каждой активации тела
+        if source is None:
+            return [goals[number] for number in plan(goals, self.store.statistics, self.analysis())]
+        generation = self.store.generation
+        entry = self.plans.get(source, None)
+        if entry is None or entry[0] != generation:
+            entry = (generation, {})
+            self.plans[source] = entry
+        key = shape(goals)
+        order = entry[1].get(key, None)
+        if order is None:
+            order = plan(goals, self.store.statistics, self.analysis())
+            entry[1][key] = order
+        return [goals[number] for number in order]
+
+    def fact_run(self, goals, index):
+        if len(self.store.wild):
+            return 0
+        return fact_run(self.analysis(), goals, index, self.tables.tabled)
+
+    def first(self, goal):
+        # факты сопоставляются прямо здесь, без генераторов
+        clauses = self.store.select_clauses(goal)
+        for clause in clauses:
+            rule = clause.rule
+            if not isinstance(rule.body, TRUE):
+                answers = self.resolve(remaining(clause, clauses), goal)
+                for answer in answers:
+                    if not isinstance(answer, FALSE):
+                        answers.close()
+                        return answer
+                return None
+            frame = Frame(rule.variables)
+            match = clause.matcher()(goal, frame)
+            if match is not None:
+                frame.bindings = match
+                return rule.head.substitute(frame)
+        return None
 
     def evaluate_rules(self, query, goal):
-        for rule in self.all_rules(query):
-            match = rule.head.match(goal)
+        return self.resolve(self.all_clauses(query, goal), goal)
+
+    def resolve(self, clauses, goal):
+        barrier = CutBarrier(clauses)  # отсечение в теле закрывает clauses
+        for clause in clauses:
+            rule = clause.rule
+            frame = Frame(rule.variables)  # свежие переменные на каждую активацию
+            match = clause.matcher()(goal, frame)
             if match is not None:
-                head = rule.head.substitute(match)
-                body = rule.body.substitute(match)
+                frame.bindings = match
+                head = rule.head.substitute(frame)
+                body = rule.body.substitute(frame)
                 if isinstance(body, Arithmetic):
-                    arith = None
-                    for arg in head.args:
-                        if isinstance(arg, Variable) and arg.name == body.name:
-                            arith = head.substitute({arg: body.evaluate()})
-                            break
-                    if arith is not None:
-                        yield arith
+                    unified = solve_arithmetic(body, {})
+                    if unified is not None:
+                        yield head.substitute(unified)
+                elif isinstance(body, Cut):
+                    barrier.cut()
+                    yield head
                 else:
-                    for item in body.query(self):
-                        if isinstance(item, CUT):
-                            yield item
-                            return
+                    if isinstance(body, Conjunction):
+                        items = body.query(self, barrier, rule)
+                    else:
+                        items = body.query(self)
+                    for item in items:
                         if not isinstance(item, FALSE):
                             yield head.substitute(body.match(item))
                         elif isinstance(item, FALSE):
                             yield item
 
+    def engine_query(self, query):
+        # движок не знает таблиц и Datalog: запрос, который может до них
+        # дойти, решается здесь, иначе левая рекурсия не завершится
+        special = self.tables.tabled
+        if self.datalog:
+            special = special | self.datalog_program().predicates.keys()
+        if not special:
+            return True
+        if len(self.store.wild):
+            return False
+        goals = body_goals(query.body) if isinstance(query, Rule) else [query]
+        for goal in goals:
+            if type(goal) is Variable:
+                return False
+            if isinstance(goal, Term):
+                found = self.reachable(goal.key)
+                if found is None or not found.isdisjoint(special):
+                    return False
+        return True
+
     def execute(self, query):
+        if self.cache is not None and isinstance(query, (Term, Rule)):
+            return self.cache.solve(self, query)
+        return self.solve(query)
+
+    def solve(self, query):
+        if self.engine is not None and self.engine_query(query):
+            yield from self.engine.execute(query)
+            return
         goal = query
         if isinstance(query, Arithmetic):
             yield query.evaluate()
         else:
             if isinstance(query, Rule):
                 goal = query.head
-            yield from self.evaluate_rules(query, goal)
\ No newline at end of file
+            if self.bottom_up(goal):
+                yield from datalog_query(self.datalog_program(), goal)
+            elif self.tables.is_tabled(goal):
+                yield from self.tables.solve(self, goal)
+            else:
+                yield from self.evaluate_rules(query, goal)
\ No newline at end of file
@@ -0,0 +1,120 @@
+from .types import Variable, Term
+from .frame import Frame
+from .merge import merge_bindings
+from .variant import term_variables
+
+NO_FRAME = Frame(())  # у фактов нет переменных, переименовывать нечего
+
+
+def fact_run(table, goals, index, tabled=()):
+    # сколько целей подряд начиная с index - вызовы предикатов из одних
+    # фактов, каждая из которых связана с предыдущими общей переменной
+    if index + 1 >= len(goals):
+        return 0
+    bound = set()
+    run = 0
+    for goal in goals[index:]:
+        if type(goal) is not Term or goal.key in tabled:
+            break
+        info = table.get(goal.key, None)
+        if info is None or not info.facts:
+            break
+        variables = term_variables(goal)
+        if run and not any(id(variable) in bound for variable in variables):
+            break
+        bound.update(map(id, variables))
+        run += 1
+    return run if run > 1 else 0
+
+
+def shared_positions(goal, bound):
+    return tuple(
+        pos for pos, arg in enumerate(goal.args)
+        if type(arg) is Variable and id(arg) in bound
+    )
+
+
+def unify_fact(goal, clause, row):
+    match = clause.matcher()(goal, NO_FRAME)
+    if match is None:
+        return None
+    return merge_bindings(match, row)
+
+
+class JoinStep:
+    # одна цель соединения. Сначала каждая строка ищет факты через индекс
+    # хранилища; когда просмотренных так клауз набирается столько же, сколько
+    # фактов у предиката, по общим позициям строится хеш-таблица, и дальше
+    # строки проверяются по ней. Короткий перебор (например, до отсечения
+    # после первого ответа) таблицу так и не строит
+    __slots__ = ('store', 'goal', 'positions', 'table', 'generation', 'scanned')
+
+    def __init__(self, store, goal, positions):
+        self.store = store
+        self.goal = goal
+        self.positions = positions  # позиции аргументов, связанных предыдущими целями
+        self.table = None
+        self.generation = None      # поколение базы, по которому построена таблица
+        self.scanned = 0            # клаузы, просмотренные через индекс
+
+    def fact_key(self, clause):
+        args = clause.rule.head.args
+        return tuple(args[pos] for pos in self.positions)
+
+    def row_key(self, row):
+        args = self.goal.args
+        return tuple(row.get(args[pos], None) for pos in self.positions)
+
+    def build(self):
+        stats = self.store.statistics.get(self.goal.key)
+        if stats is None or self.scanned < stats.count:
+            return None
+        table = {}
+        for clause in self.store.select_clauses(self.goal):
+            table.setdefault(self.fact_key(clause), []).append(clause)
+        self.generation = self.store.generation
+        return table
+
+    def clauses(self, row):
+        # таблица - снимок базы: после assert/retract факты снова ищутся
+        # через индекс, как их нашёл бы обычный вызов
+        if self.table is not None and self.generation != self.store.generation:
+            self.table = None
+            self.scanned = 0
+        if self.table is None:
+            self.table = self.build()
+        if self.table is not None:
+            return self.table.get(self.row_key(row), ())
+        return self.select(row)
+
+    def select(self, row):
+        for clause in self.store.select_clauses(self.goal.substitute(row)):
+            self.scanned += 1
+            yield clause
+
+    def solve(self, row):
+        goal = self.goal
+        for clause in self.clauses(row):
+            unified = unify_fact(goal, clause, row)
+            if unified is not None:
+                yield unified
+
+
+def join(store, goals, bindings):
+    # ответы в том же порядке, что дал бы перебор вложенными циклами:
+    # по строкам слева, а для каждой строки - по клаузам; строки идут
+    # наружу по мере нахождения
+    steps = []
+    bound = set()
+    for goal in goals:
+        steps.append(JoinStep(store, goal, shared_positions(goal, bound)))
+        bound.update(map(id, term_variables(goal)))
+
+    def extend(number, row):
+        if number == len(steps):
+            yield row
+            return
+        for unified in steps[number].solve(row):
+            yield from extend(number + 1, unified)
+
+    return extend(0, bindings)
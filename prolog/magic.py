@@ -0,0 +1,89 @@
+from .types import Variable, Term, TRUE
+from .analysis import body_goals
+from .datalog import Extension, is_constant, answers
+
+
+class MagicRule:
+    __slots__ = ('head', 'body')
+
+    def __init__(self, head, goals):
+        self.head = head
+        # тело в том же виде, что у Rule: конъюнкция - терм без имени
+        self.body = Term(None, *goals) if goals else TRUE()
+
+    def __str__(self):
+        return f'{self.head} :- {self.body}'
+
+    def __repr__(self):
+        return str(self)
+
+
+def adornment(args, bound):
+    # b - аргумент известен при вызове, f - свободен
+    return ''.join(
+        'b' if is_constant(arg) or (type(arg) is Variable and arg.name in bound)
+        else 'f'
+        for arg in args
+    )
+
+
+def adorned(pred, pattern, args):
+    return Term(f'{pred}#{pattern}', *args)
+
+
+def magic(pred, pattern, args):
+    # аргументы, отмеченные b, - запросы к предикату с этим образцом
+    return Term(f'magic#{pred}#{pattern}', *[
+        arg for arg, flag in zip(args, pattern) if flag == 'b'
+    ])
+
+
+def rewrite(predicates, base, goal):
+    # переписывание магическими множествами: правила предиката получают
+    # условие magic#..., а каждая цель тела - правило, порождающее её запросы;
+    # связанность передаётся по телу слева направо
+    pattern = adornment(goal.args, ())
+    program = {}
+    pending = [(goal.key, goal.pred, pattern)]
+    seen = {(goal.key, pattern)}
+
+    def emit(rule):
+        program.setdefault(rule.head.key, []).append(rule)
+
+    emit(MagicRule(magic(goal.pred, pattern, goal.args), []))
+    while pending:
+        key, pred, pattern = pending.pop()
+        for rule in predicates[key]:
+            head = rule.head
+            bound = {
+                arg.name for arg, flag in zip(head.args, pattern)
+                if flag == 'b' and type(arg) is Variable
+            }
+            body = [magic(pred, pattern, head.args)]
+            for call in body_goals(rule.body):
+                if call.key in base or call.key not in predicates:
+                    body.append(call)
+                else:
+                    callee = adornment(call.args, bound)
+                    emit(MagicRule(magic(call.pred, callee, call.args), list(body)))
+                    if (call.key, callee) not in seen:
+                        seen.add((call.key, callee))
+                        pending.append((call.key, call.pred, callee))
+                    body.append(adorned(call.pred, callee, call.args))
+                bound.update(
+                    arg.name for arg in call.args
+                    if type(arg) is Variable and arg.name != '_'
+                )
+            emit(MagicRule(adorned(pred, pattern, head.args), body))
+    return program, adorned(goal.pred, adornment(goal.args, ()), goal.args)
+
+
+def query(program, goal):
+    # запрос с константами вычисляется по переписанной программе,
+    # без констант - по полному вычислению
+    if goal.key in program.base:
+        return answers(program.base[goal.key], goal)
+    if not any(is_constant(arg) for arg in goal.args):
+        return program.extension().answers(goal)
+    rules, target = rewrite(program.predicates, program.base, goal)
+    return Extension(rules, program.base).answers(target, goal.pred)
@@ -0,0 +1,91 @@
+from .types import Variable, Term
+
+
+def bind(bindings, variable, value):
+    # то же, что merge_bindings для одной пары, но без копирования словаря
+    if variable in bindings:
+        sub = bindings[variable].match(value)
+        if sub is None:
+            return False
+        for var, val in sub.items():
+            bindings[var] = val
+    else:
+        bindings[variable] = value
+    return True
+
+
+def merge(bindings, sub):
+    if sub is None:
+        return False
+    for variable, value in sub.items():
+        if not bind(bindings, variable, value):
+            return False
+    return True
+
+
+def variable_step(variable):
+    def step(bindings, value, frame):
+        renamed = frame.rename(variable)
+        if value is renamed:
+            return True
+        return bind(bindings, renamed, value)
+    return step
+
+
+def constant_step(constant):
+    key = constant.key
+
+    def step(bindings, value, frame):
+        if isinstance(value, Term):
+            return value.key == key
+        if type(value) is Variable:
+            return bind(bindings, value, constant)
+        return merge(bindings, constant.match(value))
+    return step
+
+
+def compound_step(term):
+    match = compile_term(term)
+
+    def step(bindings, value, frame):
+        return merge(bindings, match(value, frame))
+    return step
+
+
+def generic_step(template):
+    def step(bindings, value, frame):
+        return merge(bindings, template.substitute(frame).match(value))
+    return step
+
+
+def compile_arg(arg):
+    if type(arg) is Variable:
+        return variable_step(arg)
+    if isinstance(arg, Term):
+        if arg.args:
+            return compound_step(arg)
+        return constant_step(arg)
+    return generic_step(arg)
+
+
+def compile_term(term):
+    key = term.key
+    steps = [compile_arg(arg) for arg in term.args]
+
+    def match(value, frame):
+        if not isinstance(value, Term):
+            return value.match(term.substitute(frame))
+        if value.key != key:
+            return None
+        bindings = {}
+        for step, item in zip(steps, value.args):
+            if not step(bindings, item, frame):
+                return None
+        return bindings
+    return match
+
+
+def compile_head(head):
+    if isinstance(head, Term):
+        return compile_term(head)
+    return lambda value, frame: head.substitute(frame).match(value)
@@ -1,7 +1,28 @@
+from .hamt import Bindings
+
+
+def extend_bindings(bindings, new):
+    # bindings - постоянное отображение: старые версии остаются верными,
+    # копируется только путь к изменённым ключам
+    for variable, value in new.items():
+        other = bindings.get(variable, None)
+        if other is None:
+            bindings = bindings.set(variable, value)
+            continue
+        sub = value.match(other)
+        if sub is None:
+            return None
+        bindings = bindings.update(sub.items())
+    return bindings
+
+
 def merge_bindings(bindings1, bindings2):
     if bindings1 is None or bindings2 is None:
         return None
 
+    if isinstance(bindings2, Bindings):
+        return extend_bindings(bindings2, bindings1)
+
     bindings = dict()
 
     bindings = {**bindings1}
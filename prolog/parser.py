@@ -1,6 +1,6 @@
 from .token import TokenType
-from .interpreter import Conjunction, Rule
-from .types import Arithmetic, Logic, Variable, Term, TRUE, Number, Dot, Bar
+from .interpreter import Conjunction, Rule, Directive
+from .types import Arithmetic, Logic, Variable, Term, TRUE, Dot, Bar, make_number
 from .builtins import Fail, Write, Nl, Tab, Retract, AssertA, AssertZ, Cut
 from .expression import BinaryExpression, PrimaryExpression
 
@@ -18,12 +18,14 @@ def is_single_param_buildin(token_type):
 
 
 class Parser:
-    def __init__(self, tokens, report=default_error_handler):
+    def __init__(self, tokens, report=default_error_handler, pool=None):
         self.current_token = 0
         self.check_done = False
         self.scope = {}
+        self.variables = []  # переменные текущей клаузы по номерам
         self.tokens = tokens
         self._report = report
+        self._pool = pool  # TermPool для общих экземпляров основных термов
 
     def peek(self):
         return self.tokens[self.current_token]
@@ -56,25 +58,46 @@ class Parser:
     def check_type(self, token, token_type):
         return token.token_type == token_type
 
+    def make_term(self, pred, *args):
+        if self._pool is None:
+            return Term(pred, *args)
+        return self._pool.term(pred, *args)
+
+    def make_number(self, value):
+        if self._pool is None:
+            return make_number(value)
+        return self._pool.number(value)
+
+    def make_list(self, items):
+        if self._pool is None:
+            return Dot.from_list(items)
+        return self._pool.list(items)
+
+    def new_variable(self, name):
+        variable = Variable(name, len(self.variables))
+        self.variables.append(variable)
+        return variable
+
     def create_variable(self, name, has_arithmetic_exp=None):
         variable = self.scope.get(name, None)
         if variable is None:
-            if has_arithmetic_exp is None:
-                variable = Variable(name)
-            else:
-                variable = Arithmetic(name, has_arithmetic_exp)
+            variable = self.new_variable(name)
             self.scope[name] = variable
-        elif isinstance(variable, Variable) and has_arithmetic_exp is not None:
-            variable = Arithmetic(name, has_arithmetic_exp)
+        if has_arithmetic_exp is not None:
+            return Arithmetic(name, has_arithmetic_exp, variable)
         return variable
 
+    def reset_scope(self):
+        self.scope = {}
+        self.variables = []
+
     def parse_primary(self):
         token = self.peek()
 
         if self.check_type(token, TokenType.NUMBER):
             self.advance()
             number_value = token.literal
-            return PrimaryExpression(Number(number_value))
+            return PrimaryExpression(self.make_number(number_value))
         elif self.check_type(token, TokenType.VARIABLE):
             self.advance()
             return PrimaryExpression(
@@ -224,10 +247,10 @@ class Parser:
         self.advance()
 
         if dot_tail is None:
-            return Dot.from_list(dot_list)
+            return self.make_list(dot_list)
 
         return Bar(
-            Dot.from_list(dot_list),
+            self.make_list(dot_list),
             dot_tail
         )
 
@@ -266,7 +289,7 @@ class Parser:
         if self.check_type(token, TokenType.VARIABLE) or \
            self.check_type(token, TokenType.UNDERSCORE):
             if self.check_type(token, TokenType.UNDERSCORE):
-                return Variable('_')
+                return self.new_variable('_')
 
             if self.check_type(token, TokenType.VARIABLE):
                 if self.peek().token_type == TokenType.IS:
@@ -288,10 +311,10 @@ class Parser:
 
         if self.check_type(token, TokenType.NUMBER):
             number_value = token.literal
-            return Number(number_value)
+            return self.make_number(number_value)
 
         if not self.token_match(TokenType.LEFTSTAPLE):
-            return Term(predicate)
+            return self.make_term(predicate)
 
         self.advance()
         args = []
@@ -314,13 +337,13 @@ class Parser:
         if self.check_type(token, TokenType.WRITE):
             return Write(*args)
 
-        return Term(predicate, *args)
+        return self.make_term(predicate, *args)
 
     def parse_rule(self):
         head = self.parse_term()
         if self.token_match(TokenType.DOT):
             self.advance()
-            return Rule(head, TRUE())
+            return Rule(head, TRUE(), tuple(self.variables))
 
         if not self.token_match(TokenType.COLONMINUS):
             self._report(
@@ -347,7 +370,42 @@ class Parser:
             body = args[0]
         else:
             body = Conjunction(args)
-        return Rule(head, body)
+        return Rule(head, body, tuple(self.variables))
+
+    def parse_indicator(self):
+        name = self.parse_atom()
+        if not self.check_type(name, TokenType.ATOM):
+            self._report(name.line, f'Expected predicate name but got {name}')
+
+        if not self.token_match(TokenType.SLASH):
+            self._report(
+                self.peek().line,
+                f'Expected / in predicate indicator but got {self.peek()}')
+        self.advance()
+
+        arity = self.advance()
+        if not self.check_type(arity, TokenType.NUMBER) or \
+           arity.literal != int(arity.literal) or arity.literal < 0:
+            self._report(arity.line, f'Bad predicate arity: {arity}')
+        return (name.lexeme, int(arity.literal))
+
+    def parse_directive(self):
+        self.advance()  # consume ':-'
+        name = self.parse_atom()
+        if name.lexeme != 'table':
+            self._report(name.line, f'Unknown directive: {name}')
+
+        indicators = [self.parse_indicator()]
+        while self.token_match(TokenType.COMMA):
+            self.advance()
+            indicators.append(self.parse_indicator())
+
+        if not self.token_match(TokenType.DOT):
+            self._report(
+                self.peek().line,
+                f'Expected . after directive but got {self.peek()}')
+        self.advance()
+        return Directive(name.lexeme, *indicators)
 
     def _all_vars(self, terms):
         variables = []
@@ -360,7 +418,7 @@ class Parser:
         return variables
 
     def parse_query(self):
-        self.scope = {}
+        self.reset_scope()
         head = self.parse_term()
 
         if self.token_match(TokenType.DOT):
@@ -397,6 +455,9 @@ class Parser:
     def parse(self):
         rules = []
         while not self.check_done:
-            self.scope = {}
-            rules.append(self.parse_rule())
+            self.reset_scope()
+            if self.token_match(TokenType.COLONMINUS):
+                rules.append(self.parse_directive())
+            else:
+                rules.append(self.parse_rule())
         return rules
@@ -0,0 +1,90 @@
+from .types import Variable, Term
+from .builtins import Cut
+from .index import arg_key
+from .variant import term_variables
+
+
+def movable(goal, analysis):
+    # переставлять можно только вызовы предикатов из одних фактов: вызов
+    # правила, тем более рекурсивного, может требовать связанных аргументов
+    if type(goal) is not Term:
+        return False
+    info = analysis.get(goal.key, None)
+    return info is not None and info.facts
+
+
+def estimate(goal, statistics, bound):
+    stats = statistics.get(goal.key)
+    if stats is None:
+        return 0  # клауз нет, вызов сразу неудачен
+    best = stats.count
+    for pos, arg in enumerate(goal.args):
+        if type(arg) is Variable:
+            if id(arg) not in bound:
+                continue
+            cost = stats.selectivity(pos)
+        else:
+            cost = stats.selectivity(pos, arg_key(arg))
+        if cost < best:
+            best = cost
+    return best
+
+
+def order(goals, segment, statistics, bound):
+    # жадно: сначала цель с наименьшим ожидаемым числом решений,
+    # при равенстве - в исходном порядке
+    segment = list(segment)
+    ordered = []
+    while segment:
+        best = min(
+            range(len(segment)),
+            key=lambda i: (estimate(goals[segment[i]], statistics, bound), segment[i])
+        )
+        number = segment.pop(best)
+        ordered.append(number)
+        bound.update(map(id, term_variables(goals[number])))
+    return ordered
+
+
+def fixed(goals):
+    # цели до последнего отсечения включительно не переставляются: от их
+    # порядка зависит, какое решение отсечение оставит
+    for number in range(len(goals) - 1, -1, -1):
+        if isinstance(goals[number], Cut):
+            return number + 1
+    return 0
+
+
+def plan(goals, statistics, analysis):
+    # номера целей в порядке выполнения; остальные цели (вызовы правил,
+    # вывод, assert/retract, арифметика и сравнения) остаются на местах
+    # и делят тело на отрезки
+    start = fixed(goals)
+    planned = list(range(start))
+    segment = []
+    bound = set()
+    for goal in goals[:start]:
+        bound.update(map(id, term_variables(goal)))
+    for number in range(start, len(goals)):
+        goal = goals[number]
+        if movable(goal, analysis):
+            segment.append(number)
+            continue
+        planned.extend(order(goals, segment, statistics, bound))
+        segment = []
+        planned.append(number)
+        bound.update(map(id, term_variables(goal)))
+    planned.extend(order(goals, segment, statistics, bound))
+    return planned
+
+
+def shape(goals):
+    # какие аргументы целей свободны. Значения связанных аргументов в ключ
+    # не входят: план клаузы считается по первому вызову с таким набором
+    # свободных аргументов и дальше не пересчитывается, даже если другие
+    # константы дали бы иной порядок. На ответы это не влияет - цели до
+    # отсечения не переставляются, остальные меняют лишь порядок решений
+    return tuple(
+        tuple(type(arg) is Variable for arg in goal.args)
+        for goal in goals if type(goal) is Term
+    )
@@ -1,4 +1,5 @@
 from .token import Token, TokenType
+from .atoms import atoms
 
 
 def default_error_handler(line, message):
@@ -45,6 +46,10 @@ class Scanner:
             )
         )
 
+    def add_atom(self, name):
+        atom = atoms.intern(name)
+        self.add_token_with_literal(TokenType.ATOM, atom, atoms.name(atom))
+
     def check_end(self):
         return self.current >= len(self.data)
 
@@ -81,7 +86,10 @@ class Scanner:
             self.current += 1
 
         token_type = self.check_keyword()
-        self.add_token(token_type)
+        if token_type == TokenType.ATOM:
+            self.add_atom(self.data[self.start:self.current])
+        else:
+            self.add_token(token_type)
 
     def complete_variable(self):
         while self.alphanum_underscore(self.peek()):
@@ -93,12 +101,15 @@ class Scanner:
         while self.peek().isdigit():
             self.current += 1
 
+        is_float = False
         if self.peek() == '.' and self.peek_next().isdigit():
+            is_float = True
             self.current += 1
             while self.peek().isdigit():
                 self.current += 1
 
-        value = float(self.data[self.start:self.current])
+        text = self.data[self.start:self.current]
+        value = float(text) if is_float else int(text)
         self.add_token_with_literal(TokenType.NUMBER, value)
 
     def complete_string(self):
@@ -111,8 +122,7 @@ class Scanner:
             self.report(self.line, 'Unterminated string')
 
         self.current += 1
-        literal = self.data[self.start+1:self.current-1]
-        self.add_token_with_literal(TokenType.ATOM, literal, literal)
+        self.add_atom(self.data[self.start+1:self.current-1])
 
     def scan_token(self):
         char = self.data[self.current]
@@ -0,0 +1,180 @@
+from .types import Arithmetic, Term
+from .interpreter import Rule
+from .trail import TrailEngine, ClauseCompiler, Ref, Struct, COMPARISON, \
+    deref, instantiate
+
+
+class Continuation:
+    __slots__ = ('body', 'index', 'frame', 'cut', 'parent')
+
+    def __init__(self, body, index, frame, cut, parent):
+        self.body = body      # цели тела клаузы
+        self.index = index    # следующая цель
+        self.frame = frame    # переменные активации
+        self.cut = cut        # высота стека точек выбора при вызове
+        self.parent = parent  # продолжение вызывающей клаузы
+
+
+class ChoicePoint:
+    __slots__ = ('goal', 'rule', 'rules', 'mark', 'clock', 'continuation')
+
+    def __init__(self, goal, rule, rules, mark, clock, continuation):
+        self.goal = goal
+        self.rule = rule          # следующая клауза-кандидат
+        self.rules = rules        # оставшиеся кандидаты
+        self.mark = mark          # длина следа при создании
+        self.clock = clock        # время создания
+        self.continuation = continuation
+
+
+class StackEngine(TrailEngine):
+    def __init__(self, database):
+        super().__init__(database)
+        self.clock = 0  # счётчик активаций для условной записи в след
+
+    def bind(self, ref, value):
+        ref.value = value
+        choicepoints = self.choicepoints
+        if choicepoints and ref.stamp <= choicepoints[-1].clock:
+            self.trail.append(ref)
+
+    def activate(self, clause):
+        self.clock += 1
+        clock = self.clock
+        return [Ref(name, clock) for name in clause.names]
+
+    def resolve(self, goal, rule, rules, continuation):
+        cut = len(self.choicepoints)
+        while rule is not None:
+            clause = self.compile(rule)
+            mark = len(self.trail)
+            frame = self.activate(clause)
+            following = next(rules, None)
+            if following is not None:
+                self.choicepoints.append(ChoicePoint(
+                    goal, following, rules, mark, self.clock - 1, continuation
+                ))
+            if all(
+                self.unify_head(arg, item, frame)
+                for arg, item in zip(clause.head.args, goal.args)
+            ):
+                if not clause.body:
+                    return continuation
+                return Continuation(clause.body, 0, frame, cut, continuation)
+            if following is not None:
+                self.choicepoints.pop()
+            self.undo(mark)
+            rule = following
+        return None
+
+    def call(self, goal, continuation):
+        goal = deref(goal)
+        if type(goal) is Ref:
+            raise Exception('Arguments are not sufficiently instantiated')
+        if type(goal) is not Struct:
+            raise Exception(f'Type error: callable expected, got {goal}')
+        rules = self.candidates(goal)
+        return self.resolve(goal, next(rules, None), rules, continuation)
+
+    def backtrack(self):
+        choicepoints = self.choicepoints
+        while choicepoints:
+            choicepoint = choicepoints.pop()
+            self.undo(choicepoint.mark)
+            continuation = self.resolve(
+                choicepoint.goal,
+                choicepoint.rule,
+                choicepoint.rules,
+                choicepoint.continuation
+            )
+            if continuation is not None:
+                return continuation
+        return None
+
+    def step(self, continuation):
+        body = continuation.body
+        index = continuation.index
+        frame = continuation.frame
+        goal = body[index]
+        if index + 1 < len(body):
+            following = Continuation(
+                body, index + 1, frame, continuation.cut, continuation.parent
+            )
+        else:
+            # последняя цель: вызываемая клауза продолжает сразу вызывающую
+            following = continuation.parent
+
+        kind = goal[0]
+        if kind == 'call':
+            return self.call(instantiate(goal[1], frame), following)
+        if kind == 'cut':
+            del self.choicepoints[continuation.cut:]
+            return following
+        if kind == 'fail':
+            return None
+        if kind == 'is':
+            value = self.evaluate(goal[2], frame)
+            if self.unify(instantiate(goal[1], frame), value):
+                return following
+            return None
+        if kind == 'compare':
+            left = self.evaluate(goal[2], frame)
+            right = self.evaluate(goal[3], frame)
+            if COMPARISON[goal[1]](left, right):
+                return following
+            return None
+        if kind == 'write':
+            for arg in goal[1]:
+                self.database.stream_write(str(self.to_term(instantiate(arg, frame))))
+            return following
+        if kind == 'text':
+            self.database.stream_write(goal[1])
+            return following
+        if kind == 'asserta':
+            self.database.insert_rule_left(self.to_term(instantiate(goal[1], frame)))
+            return following
+        if kind == 'assertz':
+            self.database.insert_rule_right(self.to_term(instantiate(goal[1], frame)))
+            return following
+        if kind == 'retract':
+            if self.retract(instantiate(goal[1], frame)):
+                return following
+            return None
+        raise Exception(f'Unknown goal {kind}')
+
+    def run(self, continuation, done):
+        while True:
+            if continuation is None:
+                continuation = self.backtrack()
+                if continuation is None:
+                    return
+            elif continuation is done:
+                yield None
+                continuation = self.backtrack()
+                if continuation is None:
+                    return
+            else:
+                continuation = self.step(continuation)
+
+    def answers(self, query):
+        if isinstance(query, Arithmetic):
+            yield query.evaluate()
+            return
+
+        if isinstance(query, Rule):
+            clause = ClauseCompiler().compile(query)
+        elif isinstance(query, Term):
+            clause = ClauseCompiler().compile(Rule(query, query))
+        else:
+            clause = ClauseCompiler().compile(Rule(Term('##'), query))
+
+        self.trail = []
+        self.choicepoints = []
+        frame = self.activate(clause)
+        done = Continuation((), 0, frame, 0, None)
+        if clause.body:
+            start = Continuation(clause.body, 0, frame, 0, done)
+        else:
+            start = done
+        for _ in self.run(start, done):
+            yield self.to_term(instantiate(clause.head, frame))
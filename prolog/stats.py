@@ -0,0 +1,67 @@
+from collections import Counter
+from .types import Term
+from .index import arg_key
+
+
+class PredicateStats:
+    __slots__ = ('count', 'keys', 'open')
+
+    def __init__(self, arity):
+        self.count = 0                                # видимых клауз
+        self.keys = [Counter() for _ in range(arity)]  # позиция -> ключ -> число клауз
+        self.open = [0] * arity                       # клаузы с переменной в позиции
+
+    def add(self, head, delta=1):
+        self.count += delta
+        for pos, arg in enumerate(head.args):
+            key = arg_key(arg)
+            if key is None:
+                self.open[pos] += delta
+                continue
+            keys = self.keys[pos]
+            keys[key] += delta
+            if keys[key] <= 0:
+                del keys[key]
+
+    def remove(self, head):
+        self.add(head, -1)
+
+    def selectivity(self, pos, key=None):
+        # ожидаемое число подходящих клауз, когда аргумент pos связан;
+        # key=None - значение станет известно только при вызове
+        keys = self.keys[pos]
+        if key is not None:
+            return keys.get(key, 0) + self.open[pos]
+        if not keys:
+            return self.count
+        return (self.count - self.open[pos]) / len(keys) + self.open[pos]
+
+    def __str__(self):
+        distinct = ', '.join(str(len(keys)) for keys in self.keys)
+        return f'{self.count} clauses, distinct keys ({distinct})'
+
+    def __repr__(self):
+        return str(self)
+
+
+class Statistics:
+    def __init__(self):
+        self.predicates = {}  # функтор -> PredicateStats
+
+    def add(self, rule):
+        head = rule.head
+        if not isinstance(head, Term):
+            return
+        stats = self.predicates.get(head.key, None)
+        if stats is None:
+            stats = PredicateStats(len(head.args))
+            self.predicates[head.key] = stats
+        stats.add(head)
+
+    def remove(self, rule):
+        head = rule.head
+        if isinstance(head, Term) and head.key in self.predicates:
+            self.predicates[head.key].remove(head)
+
+    def get(self, key):
+        return self.predicates.get(key, None)
@@ -0,0 +1,130 @@
+from itertools import chain
+from .types import Term, Variable
+from .index import Clause, ClauseSeq, PredicateIndex, goal_keys
+from .stats import Statistics
+
+
+def predicate_key(head):
+    if isinstance(head, Term):
+        return head.key
+    return None
+
+
+def same_head(rule, item):
+    return rule.head.pred == item.head.pred and \
+        len(rule.head.args) == len(item.head.args) and \
+        all([
+            x.pred == y.pred if isinstance(x, Term) and isinstance(y, Term)
+            else x.name == y.name if isinstance(x, Variable) and isinstance(y, Variable)
+            else False
+            for x, y in zip(rule.head.args, item.head.args)
+        ])
+
+
+def visible_clauses(clauses, generation):
+    for clause in clauses:
+        if clause.visible(generation):
+            yield clause
+
+
+def visible_rules(clauses, generation):
+    for clause in clauses:
+        if clause.visible(generation):
+            yield clause.rule
+
+
+class ClauseStore:
+    def __init__(self, rules=()):
+        self.generation = 0   # номер текущего поколения базы
+        self.predicates = {}  # (предикат, арность) -> PredicateIndex
+        self.wild = ClauseSeq()  # клаузы, голова которых не терм
+        self.statistics = Statistics()
+        for rule in rules:
+            self.insert_last(Clause(rule, self.generation))
+
+    def predicate(self, key, create=False):
+        if key is None:
+            return None
+        predicate = self.predicates.get(key, None)
+        if predicate is None and create:
+            predicate = PredicateIndex()
+            self.predicates[key] = predicate
+        return predicate
+
+    def next_generation(self):
+        self.generation += 1
+        return self.generation
+
+    def insert_first(self, clause):
+        self.statistics.add(clause.rule)
+        predicate = self.predicate(predicate_key(clause.rule.head), True)
+        if predicate is None:
+            self.wild.push_front(clause)
+        else:
+            predicate.add_first(clause)
+
+    def insert_last(self, clause):
+        self.statistics.add(clause.rule)
+        predicate = self.predicate(predicate_key(clause.rule.head), True)
+        if predicate is None:
+            self.wild.push_back(clause)
+        else:
+            predicate.add_last(clause)
+
+    def add_first(self, rule):
+        self.insert_first(Clause(rule, self.next_generation()))
+
+    def add_last(self, rule):
+        self.insert_last(Clause(rule, self.next_generation()))
+
+    def remove(self, rule):
+        predicate = self.predicate(predicate_key(rule.head))
+        if predicate is None:
+            return None
+        for clause in predicate:
+            if clause.visible(self.generation) and same_head(rule, clause.rule):
+                predicate.remove(clause, self.next_generation())
+                self.statistics.remove(clause.rule)
+                return clause.rule
+        return None
+
+    def discard(self, rule):
+        predicate = self.predicate(predicate_key(rule.head))
+        if predicate is None:
+            return False
+        for clause in predicate:
+            if clause.rule is rule and clause.visible(self.generation):
+                predicate.remove(clause, self.next_generation())
+                self.statistics.remove(clause.rule)
+                return True
+        return False
+
+    def candidates(self, goal):
+        predicate = self.predicate(goal.key)
+        if predicate is None:
+            return self.wild
+        candidates = predicate.select(goal_keys(goal))
+        if len(self.wild):
+            return chain(candidates, self.wild)
+        return candidates
+
+    def select(self, goal):
+        return visible_rules(self.candidates(goal), self.generation)
+
+    def select_clauses(self, goal):
+        return visible_clauses(self.candidates(goal), self.generation)
+
+    def entries(self):
+        return chain(*list(self.predicates.values()), self.wild)
+
+    def visible(self):
+        return visible_rules(self.entries(), self.generation)
+
+    def visible_clauses(self):
+        return visible_clauses(self.entries(), self.generation)
+
+    def __len__(self):
+        return sum(map(len, self.predicates.values())) + len(self.wild)
+
+    def __iter__(self):
+        return self.visible()
@@ -0,0 +1,131 @@
+from collections import OrderedDict
+from .types import Term, FALSE
+from .variant import variant_key, fresh_variant
+from .atoms import functor
+
+
+class AnswerTable:
+    def __init__(self, goal):
+        self.goal = goal
+        self.answers = []      # ответы в порядке появления
+        self.keys = set()      # варианты уже найденных ответов
+        self.complete = False
+        self.active = False    # вызов сейчас вычисляется
+        self.depth = 0         # позиция в стеке вычисляемых таблиц
+        self.leader = self     # таблица, завершающая компоненту связности
+
+    def add(self, answer):
+        key = variant_key(answer)
+        if key in self.keys:
+            return False
+        self.keys.add(key)
+        self.answers.append(answer)
+        return True
+
+    def __len__(self):
+        return len(self.answers)
+
+
+class TableSpace:
+    def __init__(self, max_answers=100000):
+        self.tabled = set()           # функторы таблируемых предикатов
+        self.tables = OrderedDict()   # вариант вызова -> AnswerTable
+        self.stack = []               # таблицы, которые сейчас вычисляются
+        self.incomplete = []          # незавершённые таблицы в порядке создания
+        self.max_answers = max_answers
+        self.size = 0                 # ответов во всех таблицах
+        self.added = 0                # счётчик новых ответов для неподвижной точки
+        self.generation = None
+
+    def table(self, pred, arity):
+        self.tabled.add(functor(pred, arity))
+
+    def is_tabled(self, goal):
+        return isinstance(goal, Term) and goal.key in self.tabled
+
+    def remove(self, key):
+        table = self.tables.pop(key)
+        self.size -= len(table)
+
+    def abolish(self):
+        for key, table in list(self.tables.items()):
+            if table.complete:
+                self.remove(key)
+
+    def evict(self):
+        for key, table in list(self.tables.items()):
+            if self.size <= self.max_answers:
+                break
+            if table.complete:
+                self.remove(key)
+
+    def find_leader(self, table):
+        while table.leader is not table:
+            table = table.leader
+        return table
+
+    def depend(self, table):
+        leader = self.find_leader(table)
+        for item in self.stack[leader.depth + 1:]:
+            item_leader = self.find_leader(item)
+            if item_leader.depth > leader.depth:
+                item_leader.leader = leader
+
+    def evaluate(self, database, table):
+        table.depth = len(self.stack)
+        table.active = True
+        self.stack.append(table)
+        try:
+            while True:
+                added = self.added
+                for answer in database.evaluate_rules(table.goal, table.goal):
+                    if isinstance(answer, FALSE):
+                        continue
+                    if table.add(answer):
+                        self.size += 1
+                        self.added += 1
+                if self.added == added:
+                    break
+        finally:
+            self.stack.pop()
+            table.active = False
+
+    def solve(self, database, goal):
+        if self.generation != database.store.generation:
+            self.abolish()
+            self.generation = database.store.generation
+
+        key = variant_key(goal)
+        table = self.tables.get(key, None)
+        if table is not None:
+            if table.complete:
+                self.tables.move_to_end(key)
+            elif table.active:
+                # рекурсивный вызов варианта: берём уже найденные ответы
+                self.depend(table)
+            else:
+                self.depend(table)
+                self.evaluate(database, table)
+            yield from table.answers[:]
+            return
+
+        table = AnswerTable(fresh_variant(goal))
+        self.tables[key] = table
+        start = len(self.incomplete)
+        self.incomplete.append(table)
+        try:
+            self.evaluate(database, table)
+        except BaseException:
+            for item in self.incomplete[start:]:
+                if self.tables.pop(variant_key(item.goal), None) is not None:
+                    self.size -= len(item)
+            del self.incomplete[start:]
+            raise
+
+        if self.find_leader(table) is table:
+            for item in self.incomplete[start:]:
+                item.complete = True
+            del self.incomplete[start:]
+            self.evict()
+
+        yield from table.answers[:]
@@ -1,6 +1,8 @@
 from enum import Enum, auto
 
 class Token:
+    __slots__ = ('token_type', 'lexeme', 'literal', 'line')
+
     def __init__(self, token_type, lexeme, literal, line):
         self.token_type = token_type
         self.lexeme = lexeme
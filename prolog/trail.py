@@ -0,0 +1,478 @@
+import operator
+from weakref import WeakKeyDictionary
+from .types import Variable, Term, Number, Dot, Bar, Arithmetic, Logic, TRUE, \
+    number_key
+from .builtins import Write, Nl, Tab, Fail, Cut, Retract, AssertA, AssertZ
+from .expression import BinaryExpression, PrimaryExpression
+from .interpreter import Rule, Conjunction
+from .atoms import functor
+
+
+ARITHMETIC = {
+    '*': operator.mul,
+    '/': operator.truediv,
+    '+': operator.add,
+    '-': operator.sub
+}
+
+COMPARISON = {
+    '==': operator.eq,
+    '=/': operator.ne,
+    '=<': operator.le,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '>': operator.gt
+}
+
+
+class Ref:
+    __slots__ = ('name', 'value', 'stamp')
+
+    def __init__(self, name='_', stamp=0):
+        self.name = name
+        self.value = None   # None - переменная свободна
+        self.stamp = stamp  # время создания, для условной записи в след
+
+    def __str__(self):
+        value = deref(self)
+        if isinstance(value, Ref):
+            return f'_{value.name}'
+        return str(value)
+
+    def __repr__(self):
+        return str(self)
+
+
+class Struct:
+    __slots__ = ('name', 'key', 'args')
+
+    def __init__(self, name, args=(), key=None):
+        self.name = name
+        self.key = functor(name, len(args)) if key is None else key
+        self.args = args
+
+    def __str__(self):
+        if not self.args:
+            return str(self.name)
+        args = ', '.join(map(str, self.args))
+        return f'{self.name}({args})'
+
+    def __repr__(self):
+        return str(self)
+
+
+NIL = Struct('[]')
+LIST = Struct('.', (NIL, NIL))
+
+
+class Slot:
+    __slots__ = ('index', 'name')
+
+    def __init__(self, index, name):
+        self.index = index
+        self.name = name
+
+
+class Anonymous:
+    __slots__ = ()
+
+
+class Skeleton:
+    __slots__ = ('name', 'key', 'args')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.key = functor(name, len(args))
+        self.args = args
+
+
+ANONYMOUS = Anonymous()
+
+
+def deref(value):
+    while type(value) is Ref:
+        if value.value is None:
+            return value
+        value = value.value
+    return value
+
+
+def instantiate(template, frame):
+    kind = type(template)
+    if kind is Slot:
+        return frame[template.index]
+    if kind is Skeleton:
+        return Struct(
+            template.name,
+            tuple(instantiate(arg, frame) for arg in template.args),
+            template.key
+        )
+    if kind is Anonymous:
+        return Ref()
+    return template
+
+
+def arg_key(value):
+    value = deref(value)
+    if type(value) is Struct:
+        return value.key
+    if type(value) is Ref:
+        return None
+    return number_key(value)
+
+
+class CompiledClause:
+    def __init__(self, head, body, names):
+        self.head = head    # шаблон головы
+        self.body = body    # список целей тела
+        self.names = names  # имена переменных клаузы по номерам слотов
+
+
+class ClauseCompiler:
+    def __init__(self):
+        self.slots = {}
+
+    def compile(self, rule):
+        head = self.term(rule.head)
+        body = self.body(rule.body, [])
+        return CompiledClause(head, body, list(self.slots))
+
+    def slot(self, name):
+        if name == '_':
+            return ANONYMOUS
+        slot = self.slots.get(name, None)
+        if slot is None:
+            slot = Slot(len(self.slots), name)
+            self.slots[name] = slot
+        return slot
+
+    def term(self, term):
+        if isinstance(term, Variable):
+            return self.slot(term.name)
+        if isinstance(term, Number):
+            return term.pred
+        if isinstance(term, Term):
+            if not term.args:
+                return Struct(term.pred)
+            return self.struct(term.pred, [self.term(arg) for arg in term.args])
+        if isinstance(term, Dot):
+            return self.list(list(term), NIL)
+        if isinstance(term, Bar):
+            return self.list(list(term.head), self.term(term.tail))
+        raise Exception(f'Cannot compile term {term}')
+
+    def list(self, items, tail):
+        result = tail
+        for item in reversed(items):
+            result = self.struct('.', [self.term(item), result])
+        return result
+
+    def struct(self, name, args):
+        if any(type(arg) in (Slot, Skeleton, Anonymous) for arg in args):
+            return Skeleton(name, tuple(args))
+        return Struct(name, tuple(args))
+
+    def expression(self, expr):
+        if isinstance(expr, BinaryExpression):
+            return (
+                expr.operand,
+                self.expression(expr.left),
+                self.expression(expr.right)
+            )
+        if isinstance(expr, PrimaryExpression):
+            return self.term(expr.exp)
+        return self.term(expr)
+
+    def body(self, goal, goals):
+        if isinstance(goal, TRUE):
+            pass
+        elif isinstance(goal, Conjunction):
+            for arg in goal.args:
+                self.body(arg, goals)
+        elif isinstance(goal, Arithmetic):
+            goals.append((
+                'is',
+                self.slot(goal.name),
+                self.expression(goal._expression)
+            ))
+        elif isinstance(goal, Logic):
+            expr = goal._expression
+            goals.append((
+                'compare',
+                expr.operand,
+                self.expression(expr.left),
+                self.expression(expr.right)
+            ))
+        elif isinstance(goal, Fail):
+            goals.append(('fail',))
+        elif isinstance(goal, Cut):
+            goals.append(('cut',))
+        elif isinstance(goal, Write):
+            goals.append(('write', [self.term(arg) for arg in goal.args]))
+        elif isinstance(goal, Nl):
+            goals.append(('text', '\n'))
+        elif isinstance(goal, Tab):
+            goals.append(('text', '\t'))
+        elif isinstance(goal, AssertA):
+            goals.append(('asserta', self.term(goal.arg)))
+        elif isinstance(goal, AssertZ):
+            goals.append(('assertz', self.term(goal.arg)))
+        elif isinstance(goal, Retract):
+            goals.append(('retract', self.term(goal.arg)))
+        else:
+            goals.append(('call', self.term(goal)))
+        return goals
+
+
+class CutBarrier:
+    __slots__ = ('cut',)
+
+    def __init__(self):
+        self.cut = False
+
+
+class TrailEngine:
+    def __init__(self, database):
+        self.database = database
+        self.trail = []  # связанные переменные в порядке связывания
+        self.choicepoints = []  # точки выбора, у движков с явным стеком
+        self.compiled = WeakKeyDictionary()
+
+    def compile(self, rule):
+        compiled = self.compiled.get(rule, None)
+        if compiled is None:
+            compiled = ClauseCompiler().compile(rule)
+            self.compiled[rule] = compiled
+        return compiled
+
+    def bind(self, ref, value):
+        ref.value = value
+        self.trail.append(ref)
+
+    def undo(self, mark):
+        trail = self.trail
+        while len(trail) > mark:
+            trail.pop().value = None
+
+    def unify(self, left, right):
+        stack = [(left, right)]
+        while stack:
+            left, right = stack.pop()
+            left = deref(left)
+            right = deref(right)
+            if left is right:
+                continue
+            if type(left) is Ref:
+                self.bind(left, right)
+            elif type(right) is Ref:
+                self.bind(right, left)
+            elif type(left) is Struct:
+                if type(right) is not Struct or left.key != right.key:
+                    return False
+                stack.extend(zip(left.args, right.args))
+            elif type(left) is not type(right) or left != right:
+                return False
+        return True
+
+    def unify_head(self, template, value, frame):
+        kind = type(template)
+        if kind is Slot:
+            return self.unify(frame[template.index], value)
+        if kind is Anonymous:
+            return True
+        if kind is Skeleton:
+            value = deref(value)
+            if type(value) is Ref:
+                self.bind(value, instantiate(template, frame))
+                return True
+            if type(value) is not Struct or value.key != template.key:
+                return False
+            for arg, item in zip(template.args, value.args):
+                if not self.unify_head(arg, item, frame):
+                    return False
+            return True
+        return self.unify(template, value)
+
+    def evaluate(self, expr, frame):
+        if type(expr) is tuple:
+            operand, left, right = expr
+            function = ARITHMETIC.get(operand, None)
+            if function is None:
+                raise Exception(f'Invalid binary operand {operand}')
+            return function(
+                self.evaluate(left, frame),
+                self.evaluate(right, frame)
+            )
+        value = deref(instantiate(expr, frame))
+        if type(value) is Ref or type(value) is Struct:
+            raise Exception(f'Arithmetic: {self.to_term(value)} is not a number')
+        return value
+
+    def candidates(self, goal):
+        store = self.database.store
+        predicate = store.predicate(goal.key)
+        if predicate is None:
+            return iter(())
+        generation = store.generation
+        keys = tuple(map(arg_key, goal.args))
+        return (
+            clause.rule for clause in predicate.select(keys)
+            if clause.visible(generation)
+        )
+
+    def clauses(self, goal):
+        return list(self.candidates(goal))
+
+    def solve(self, goal):
+        goal = deref(goal)
+        if type(goal) is Ref:
+            raise Exception('Arguments are not sufficiently instantiated')
+        if type(goal) is not Struct:
+            raise Exception(f'Type error: callable expected, got {goal}')
+
+        for rule in self.clauses(goal):
+            clause = self.compile(rule)
+            mark = len(self.trail)
+            frame = [Ref(name) for name in clause.names]
+            if all(
+                self.unify_head(arg, item, frame)
+                for arg, item in zip(clause.head.args, goal.args)
+            ):
+                barrier = CutBarrier()
+                yield from self.solve_body(clause.body, 0, frame, barrier)
+                if barrier.cut:
+                    self.undo(mark)
+                    return
+            self.undo(mark)
+
+    def solve_body(self, body, index, frame, barrier):
+        if index == len(body):
+            yield None
+            return
+
+        goal = body[index]
+        kind = goal[0]
+        if kind == 'call':
+            for _ in self.solve(instantiate(goal[1], frame)):
+                yield from self.solve_body(body, index + 1, frame, barrier)
+                if barrier.cut:
+                    return
+        elif kind == 'cut':
+            yield from self.solve_body(body, index + 1, frame, barrier)
+            barrier.cut = True
+        elif kind == 'fail':
+            return
+        elif kind == 'is':
+            mark = len(self.trail)
+            value = self.evaluate(goal[2], frame)
+            if self.unify(instantiate(goal[1], frame), value):
+                yield from self.solve_body(body, index + 1, frame, barrier)
+            self.undo(mark)
+        elif kind == 'compare':
+            left = self.evaluate(goal[2], frame)
+            right = self.evaluate(goal[3], frame)
+            if COMPARISON[goal[1]](left, right):
+                yield from self.solve_body(body, index + 1, frame, barrier)
+        elif kind == 'write':
+            for arg in goal[1]:
+                self.database.stream_write(str(self.to_term(instantiate(arg, frame))))
+            yield from self.solve_body(body, index + 1, frame, barrier)
+        elif kind == 'text':
+            self.database.stream_write(goal[1])
+            yield from self.solve_body(body, index + 1, frame, barrier)
+        elif kind == 'asserta':
+            self.database.insert_rule_left(self.to_term(instantiate(goal[1], frame)))
+            yield from self.solve_body(body, index + 1, frame, barrier)
+        elif kind == 'assertz':
+            self.database.insert_rule_right(self.to_term(instantiate(goal[1], frame)))
+            yield from self.solve_body(body, index + 1, frame, barrier)
+        elif kind == 'retract':
+            mark = len(self.trail)
+            if self.retract(instantiate(goal[1], frame)):
+                yield from self.solve_body(body, index + 1, frame, barrier)
+            self.undo(mark)
+
+    def retract(self, term):
+        term = deref(term)
+        if type(term) is not Struct:
+            return False
+        for rule in self.clauses(term):
+            clause = self.compile(rule)
+            if clause.body:
+                continue
+            mark = len(self.trail)
+            frame = [Ref(name) for name in clause.names]
+            if self.unify(instantiate(clause.head, frame), term):
+                self.database.discard_rule(rule)
+                return True
+            self.undo(mark)
+        return False
+
+    def to_term(self, value, variables=None):
+        if variables is None:
+            variables = {}
+        value = deref(value)
+        if type(value) is Ref:
+            variable = variables.get(id(value), None)
+            if variable is None:
+                # номер делает имена различными: свободные переменные разных
+                # активаций могут называться одинаково
+                variable = Variable(f'_{value.name}{len(variables)}')
+                variables[id(value)] = variable
+            return variable
+        if type(value) is Struct:
+            if value.key == LIST.key:
+                items = []
+                while type(value) is Struct and value.key == LIST.key:
+                    items.append(self.to_term(value.args[0], variables))
+                    value = deref(value.args[1])
+                if type(value) is Struct and value.key == NIL.key:
+                    return Dot.from_list(items)
+                return Bar(Dot.from_list(items), self.to_term(value, variables))
+            if value.key == NIL.key:
+                return Dot.from_list([])
+            return Term(
+                value.name,
+                *[self.to_term(arg, variables) for arg in value.args]
+            )
+        return Number(value)
+
+    def execute(self, query):
+        return self.isolated(self.answers(query))
+
+    def isolated(self, answers):
+        # у каждого запроса свой след и стек точек выбора: пока запрос стоит
+        # на ответе, движок может быть вызван снова для другой подцели
+        # (из таблицы или Datalog), и её след не должен затереть этот
+        state = ([], [])
+        try:
+            while True:
+                saved = (self.trail, self.choicepoints)
+                self.trail, self.choicepoints = state
+                try:
+                    answer = next(answers, None)
+                finally:
+                    state = (self.trail, self.choicepoints)
+                    self.trail, self.choicepoints = saved
+                if answer is None:
+                    return
+                yield answer
+        finally:
+            answers.close()
+
+    def answers(self, query):
+        if isinstance(query, Arithmetic):
+            yield query.evaluate()
+            return
+
+        if isinstance(query, Rule):
+            clause = ClauseCompiler().compile(query)
+        elif isinstance(query, Term):
+            clause = ClauseCompiler().compile(Rule(query, query))
+        else:
+            clause = ClauseCompiler().compile(Rule(Term('##'), query))
+
+        self.trail = []
+        frame = [Ref(name) for name in clause.names]
+        for _ in self.solve_body(clause.body, 0, frame, CutBarrier()):
+            yield self.to_term(instantiate(clause.head, frame))
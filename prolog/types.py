@@ -1,12 +1,30 @@
+import operator
 from functools import reduce
 from .mathlogicinterpreter import MathInterpreter, LogicInterpreter
 from .expression import Visitor, PrimaryExpression, BinaryExpression
 from .merge import merge_bindings
+from .atoms import functor
+
+
+def is_ground(term):
+    return getattr(term, 'ground', False)
+
+
+def substitute_args(args, bindings):
+    new_args = [arg.substitute(bindings) for arg in args]
+    for new, old in zip(new_args, args):
+        if new is not old:
+            return new_args
+    return None
 
 
 class Variable:
-    def __init__(self, name):
+    __slots__ = ('name', 'index')
+    ground = False
+
+    def __init__(self, name, index=None):
         self.name = name
+        self.index = index  # номер в клаузе, None - переменная вне клаузы
 
     def match(self, other):
         bindings = dict()
@@ -28,39 +46,67 @@ class Variable:
 
 
 class Dot:
-    def __init__(self, head, tail=None):
-        self._name = '.'
-        self.head = head
-        self.tail = tail
-        self._current_element = self
+    __slots__ = ('items', 'start', 'stop', '_ground', '_hash')
+    _name = '.'
+
+    def __init__(self, items=(), start=0, stop=None, ground=None):
+        self.items = items  # общий кортеж элементов
+        self.start = start
+        self.stop = len(items) if stop is None else stop
+        self._ground = ground
+        self._hash = None
 
     @classmethod
     def from_list(cls, lst):
-        if not lst:
-            return cls([])
-        head = Dot(lst[0])
-        first_head = head
-        for elem in lst[1:]:
-            head.tail = Dot(elem)
-            head = head.tail
-        return first_head
+        return cls(tuple(lst))
 
     @staticmethod
     def concat(dot1, dot2):
-        return Dot.from_list(
-            list(dot1) + list(dot2)
-        )
+        size = len(dot1)
+        if dot2.start >= size and all(
+            map(operator.is_, dot1, dot2.items[dot2.start - size:dot2.start])
+        ):
+            # dot1 - те же элементы, что стоят перед отрезком dot2: вид
+            # на общий кортеж вместо копии
+            ground = True if dot1.ground and dot2._ground else None
+            return Dot(dot2.items, dot2.start - size, dot2.stop, ground)
+        return Dot(tuple(dot1) + tuple(dot2))
+
+    @property
+    def ground(self):
+        if self._ground is None:
+            self._ground = all(map(is_ground, self))
+        return self._ground
+
+    @property
+    def head(self):
+        return self.items[self.start]
+
+    @property
+    def tail(self):
+        return self.slice(1)
+
+    def slice(self, start, stop=None):
+        start = min(self.start + start, self.stop)
+        stop = self.stop if stop is None else min(self.start + stop, self.stop)
+        if start == self.start and stop == self.stop:
+            return self
+        return Dot(self.items, start, max(start, stop), True if self._ground else None)
 
     def match_lsts(self, lst1, lst2):
-        m = list(
-                map(
-                    (lambda arg1, arg2: arg1.match(arg2)),
-                    lst1,
-                    lst2
-                )
+        return reduce(
+            merge_bindings,
+            map(
+                (lambda arg1, arg2: arg1.match(arg2)),
+                lst1,
+                lst2
+            ),
+            {}
         )
 
-        return reduce(merge_bindings, [{}] + m)
+    def same_view(self, other):
+        return self.items is other.items and \
+            self.start == other.start and self.stop == other.stop
 
     def match(self, other):
         if isinstance(other, Bar):
@@ -69,31 +115,45 @@ class Dot:
         if not isinstance(other, Dot):
             return {}
 
-        l1 = list(self)
-        l2 = list(other)
-        if len(l1) == len(l2):
-            return self.match_lsts(l1, l2)
+        if self is other or self.same_view(other):
+            # один и тот же отрезок: поэлементно сопоставлять нечего
+            return {}
+
+        if len(self) == len(other):
+            return self.match_lsts(self, other)
         return None
 
     def substitute(self, bindings):
-        return Dot.from_list(list(map(
-            (lambda arg: arg.substitute(bindings)),
-            self
-        )))
+        if self.ground:
+            return self
+        items = list(self)
+        new_items = substitute_args(items, bindings)
+        if new_items is None:
+            return self
+        return Dot(tuple(new_items))
 
     def query(self, runtime):
         yield from runtime.execute(self)
 
+    def __len__(self):
+        return self.stop - self.start
+
     def __iter__(self):
-        self._current_element = self
-        return self
+        return map(self.items.__getitem__, range(self.start, self.stop))
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Dot):
+            return NotImplemented
+        if len(self) != len(other) or hash(self) != hash(other):
+            return False
+        return all(map(operator.eq, self, other))
 
-    def __next__(self):
-        if self._current_element is None:
-            raise StopIteration
-        element = self._current_element.head
-        self._current_element = self._current_element.tail
-        return element
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(('.', tuple(self)))
+        return self._hash
 
     def __str__(self):
         return str(list(self))
@@ -103,20 +163,23 @@ class Dot:
 
 
 class Bar:
+    __slots__ = ('head', 'tail', 'ground', '_hash')
+
     def __init__(self, head, tail):
         self.head = head
         self.tail = tail
+        self.ground = is_ground(head) and is_ground(tail)
+        self._hash = None
 
     def match(self, other):
         if not isinstance(other, Dot):
             return None
 
-        other_left = list(other)[:len(list(self.head))]
-        other_right = list(other)[len(list(self.head)):]
-        other_head = Dot.from_list(other_left)
-        other_tail = Dot.from_list(other_right)
-        head_match = self.head.match(other_head)
-        tail_match = self.tail.match(other_tail)
+        size = len(self.head)
+        if len(other) < size:
+            return None
+        head_match = self.head.match(other.slice(0, size))
+        tail_match = self.tail.match(other.slice(size))
 
         if head_match is not None and tail_match is not None:
             return {**head_match, **tail_match}
@@ -124,13 +187,33 @@ class Bar:
         return None
 
     def substitute(self, bindings):
+        if self.ground:
+            return self
         new_head = self.head.substitute(bindings)
         new_tail = self.tail.substitute(bindings)
+        if new_head is self.head and new_tail is self.tail:
+            return self
+        if isinstance(new_tail, Dot):
+            # хвост стал списком - получился обычный список
+            return Dot.concat(new_head, new_tail)
         return Bar(new_head, new_tail)
 
     def query(self, runtime):
         yield from runtime.execute(self)
 
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Bar):
+            return NotImplemented
+        return hash(self) == hash(other) and \
+            self.head == other.head and self.tail == other.tail
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(('|', self.head, self.tail))
+        return self._hash
+
     def __str__(self):
         output = '['
         output += ', '.join(map(str, self.head))
@@ -144,14 +227,18 @@ class Bar:
 
 
 class Term:
+    __slots__ = ('pred', 'key', 'args', 'ground', '_hash')
+
     def __init__(self, pred, *args):
         self.pred = pred
-        self.args = list(args)
+        self.key = functor(pred, len(args))  # (номер атома, арность)
+        self.args = args
+        self.ground = all(map(is_ground, self.args))
+        self._hash = None
 
     def match(self, other):
         if isinstance(other, Term):
-            if self.pred != other.pred or \
-               len(self.args) != len(other.args):
+            if self.key != other.key:
                 return None
 
             m = list(
@@ -167,14 +254,30 @@ class Term:
         return other.match(self)
 
     def substitute(self, bindings):
-        return Term(self.pred, *map(
-            (lambda arg: arg.substitute(bindings)),
-            self.args
-        ))
+        if self.ground:
+            return self
+        args = substitute_args(self.args, bindings)
+        if args is None:
+            return self
+        return Term(self.pred, *args)
 
     def query(self, runtime):
         yield from runtime.execute(self)
 
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Term):
+            return NotImplemented
+        return self.key == other.key and \
+            hash(self) == hash(other) and \
+            self.args == other.args
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash((self.key, self.args))
+        return self._hash
+
     def __str__(self):
         if len(self.args) == 0:
             return f'{self.pred}'
@@ -186,11 +289,20 @@ class Term:
 
 
 class Logic():
-    def __init__(self, expression):
+    __slots__ = ('_expression', '_program', '_values')
+    ground = False
+
+    def __init__(self, expression, program=None, values=None):
         self._expression = expression
+        # программа компилируется один раз, при разборе
+        self._program = compile_logic(expression) if program is None else program
+        # значения переменных выражения по слотам программы
+        self._values = self._program.variables if values is None else values
 
     def match(self, other):
         bindings = dict()
+        if isinstance(other, Logic):
+            return bindings  # сравнение ничего не связывает
         if self != other:
             bindings[self] = self.evaluate()
         return bindings
@@ -199,28 +311,40 @@ class Logic():
         value = bindings.get(self, None)
         if value is not None:
             return value.substitute(bindings)
+        return Logic(self._expression, self._program, substitute_values(self._values, bindings))
 
-        expression_binder = ExpressionBinder(bindings)
-        expression = self._expression.accept(expression_binder)
-        return Logic(expression)
+    def bound_expression(self):
+        return self._program.bind(self._expression, self._values)
 
     def evaluate(self):
-        return self._expression.accept(logic_interpreter)
+        program = self._program
+        if program.function is not None:
+            args = program.arguments(self._values)
+            if args is not None:
+                return TRUE() if program.function(*args) else FALSE()
+        return self.bound_expression().accept(logic_interpreter)
 
     def query(self, runtime):
         yield self.evaluate()
 
     def __str__(self):
-        return f'{self._expression}'
+        return f'{self.bound_expression()}'
 
     def __repr__(self):
         return str(self)
 
 
 class Arithmetic(Variable):
-    def __init__(self, name, expression):
+    __slots__ = ('_expression', '_program', '_values', 'target')
+
+    def __init__(self, name, expression, target, program=None, values=None):
         super().__init__(name)
         self._expression = expression
+        self.target = target  # переменная (или значение) слева от is
+        # программа компилируется один раз, при разборе
+        self._program = compile_arithmetic(expression) if program is None else program
+        # значения переменных выражения по слотам программы
+        self._values = self._program.variables if values is None else values
 
     @property
     def args(self):
@@ -228,16 +352,11 @@ class Arithmetic(Variable):
 
     @property
     def var(self):
-        return self
-
-    def bind_name(self, bindings):
-        for k, v in bindings.items():
-            if isinstance(k, Variable) and k.name == self.name:
-                if isinstance(v, Variable):
-                    return v.name
-        return self.name
+        return self.target
 
     def match(self, other):
+        if isinstance(other, Arithmetic):
+            return self.target.match(other.target)
         bindings = dict()
         if self != other:
             bindings[self] = self.evaluate()
@@ -248,14 +367,24 @@ class Arithmetic(Variable):
         if value is not None:
             return value.substitute(bindings)
 
-        expression_binder = ExpressionBinder(bindings)
-        name = self.bind_name(bindings)
-        expression = self._expression.accept(expression_binder)
-        return Arithmetic(name, expression)
+        return Arithmetic(
+            self.name,
+            self._expression,
+            self.target.substitute(bindings),
+            self._program,
+            substitute_values(self._values, bindings)
+        )
+
+    def bound_expression(self):
+        return self._program.bind(self._expression, self._values)
 
     def evaluate(self):
-        val = self._expression.accept(math_interpreter)
-        return val
+        program = self._program
+        if program.function is not None:
+            args = program.arguments(self._values)
+            if args is not None:
+                return make_number(program.function(*args))
+        return self.bound_expression().accept(math_interpreter)
 
     def query(self, runtime):
         yield self
@@ -267,21 +396,31 @@ class Arithmetic(Variable):
         return str(self)
 
 
+def number_key(value):
+    # 1 и 1.0 - разные константы, их ключи не должны совпадать
+    if type(value) is float:
+        return (value,)
+    return value
+
+
 class Number(Term):
+    __slots__ = ()
+
     def __init__(self, pred):
         super().__init__(pred)
+        self.key = number_key(pred)
 
     def multiply(self, number):
-        return Number(self.pred * number.pred)
+        return make_number(self.pred * number.pred)
 
     def divide(self, number):
-        return Number(self.pred / number.pred)
+        return make_number(self.pred / number.pred)
 
     def add(self, number):
-        return Number(self.pred + number.pred)
+        return make_number(self.pred + number.pred)
 
     def substract(self, number):
-        return Number(self.pred - number.pred)
+        return make_number(self.pred - number.pred)
 
     def equal(self, number):
         if self.pred == number.pred:
@@ -315,8 +454,17 @@ class Number(Term):
 
 
 class TRUE(Term):
+    __slots__ = ()
+    instance = None
+
+    def __new__(cls):
+        if cls.instance is None:
+            cls.instance = super().__new__(cls)
+            Term.__init__(cls.instance, cls)
+        return cls.instance
+
     def __init__(self):
-        super().__init__(TRUE)
+        pass
 
     def substitute(self, bindings):
         return self
@@ -326,8 +474,17 @@ class TRUE(Term):
 
 
 class FALSE(Term):
+    __slots__ = ()
+    instance = None
+
+    def __new__(cls):
+        if cls.instance is None:
+            cls.instance = super().__new__(cls)
+            Term.__init__(cls.instance, cls)
+        return cls.instance
+
     def __init__(self):
-        super().__init__(FALSE)
+        pass
 
     def substitute(self, bindings):
         return {}
@@ -336,15 +493,15 @@ class FALSE(Term):
         yield self
 
 
-class CUT(Term):
-    def __init__(self):
-        super().__init__(CUT)
+SMALL_INTS = range(-128, 1024)
+small_numbers = [Number(value) for value in SMALL_INTS]
 
-    def substitute(self, bindings):
-        return {}
 
-    def query(self, runtime):
-        yield self
+def make_number(value):
+    # малые целые - общие экземпляры, счётчики не создают новых объектов
+    if type(value) is int and SMALL_INTS.start <= value < SMALL_INTS.stop:
+        return small_numbers[value - SMALL_INTS.start]
+    return Number(value)
 
 
 class ExpressionBinder(Visitor):
@@ -363,12 +520,142 @@ class ExpressionBinder(Visitor):
     def visit_primary(self, expr):
         exp = expr.exp
         if isinstance(exp, Variable):
-            for k, v in self._bindings.items():
-                if k.name == exp.name:
-                    return PrimaryExpression(v)
+            value = exp.substitute(self._bindings)
+            if value is not exp:
+                return PrimaryExpression(value)
 
         return expr
 
 
+def substitute_values(values, bindings):
+    # значения слотов подставляются сразу, а не копятся цепочкой подстановок
+    new_values = substitute_args(values, bindings)
+    if new_values is None:
+        return values
+    return tuple(new_values)
+
+
+class VariableCollector(Visitor):
+    def __init__(self):
+        self.variables = []
+        self.names = set()
+
+    def visit_binary(self, expr):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_primary(self, expr):
+        exp = expr.exp
+        if type(exp) is Variable and exp.name not in self.names:
+            self.names.add(exp.name)
+            self.variables.append(exp)
+
+
+def expression_variables(expression):
+    collector = VariableCollector()
+    if isinstance(expression, (BinaryExpression, PrimaryExpression)):
+        expression.accept(collector)
+    return tuple(collector.variables)
+
+
+class Program:
+    __slots__ = ('variables', 'function')
+
+    def __init__(self, variables=(), function=None):
+        self.variables = variables  # переменные выражения по номерам слотов
+        self.function = function    # None - выражение вычисляется обходом дерева
+
+    def arguments(self, values):
+        args = []
+        for value in values:
+            if type(value) is not Number:
+                return None
+            args.append(value.pred)
+        return args
+
+    def bind(self, expression, values):
+        bindings = {
+            variable: value for variable, value in zip(self.variables, values)
+            if value is not variable
+        }
+        if not bindings:
+            return expression
+        return expression.accept(ExpressionBinder(bindings))
+
+
+class ExpressionCompiler(Visitor):
+    def __init__(self, operators):
+        self.operators = operators
+        self.variables = []
+        self.slots = {}      # имя переменной -> номер слота
+        self.constants = {}  # имя константы в коде -> значение
+
+    def visit_binary(self, expr):
+        if expr.operand not in self.operators:
+            return None
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        if left is None or right is None:
+            return None
+        return f'({left} {expr.operand} {right})'
+
+    def visit_primary(self, expr):
+        exp = expr.exp
+        if type(exp) is Number:
+            name = f'c{len(self.constants)}'
+            self.constants[name] = exp.pred
+            return name
+        if type(exp) is Variable:
+            slot = self.slots.get(exp.name, None)
+            if slot is None:
+                slot = len(self.variables)
+                self.slots[exp.name] = slot
+                self.variables.append(exp)
+            return f'v{slot}'
+        return None
+
+    def compile(self, source, expression):
+        if source is None:
+            return Program(expression_variables(expression))
+        params = ', '.join(f'v{slot}' for slot in range(len(self.variables)))
+        function = eval(f'lambda {params}: {source}', dict(self.constants))
+        return Program(tuple(self.variables), function)
+
+
+ARITHMETIC_OPERATORS = ('*', '/', '+', '-')
+COMPARISON_OPERATORS = {
+    '==': '==',
+    '=/': '!=',
+    '=<': '<=',
+    '<': '<',
+    '>=': '>=',
+    '>': '>'
+}
+
+
+def compile_arithmetic(expression):
+    if not isinstance(expression, BinaryExpression):
+        return Program(expression_variables(expression))
+    compiler = ExpressionCompiler(ARITHMETIC_OPERATORS)
+    return compiler.compile(expression.accept(compiler), expression)
+
+
+def compile_logic(expression):
+    # LogicInterpreter не вычисляет вложенную арифметику, поэтому только сравнение двух значений
+    if not isinstance(expression, BinaryExpression) or \
+       not isinstance(expression.left, PrimaryExpression) or \
+       not isinstance(expression.right, PrimaryExpression):
+        return Program(expression_variables(expression))
+    operator = COMPARISON_OPERATORS.get(expression.operand, None)
+    if operator is None:
+        return Program(expression_variables(expression))
+    compiler = ExpressionCompiler(())
+    left = expression.left.accept(compiler)
+    right = expression.right.accept(compiler)
+    if left is None or right is None:
+        return Program(expression_variables(expression))
+    return compiler.compile(f'{left} {operator} {right}', expression)
+
+
 math_interpreter = MathInterpreter()
 logic_interpreter = LogicInterpreter()
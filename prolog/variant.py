@@ -0,0 +1,61 @@
+from .types import Variable, Term, Dot, Bar, Arithmetic, Logic
+from .expression import BinaryExpression
+
+
+def term_variables(term, variables=None):
+    if variables is None:
+        variables = []
+    if isinstance(term, Variable):
+        if not any(var is term for var in variables):
+            variables.append(term)
+    elif isinstance(term, Term):
+        for arg in term.args:
+            term_variables(arg, variables)
+    elif isinstance(term, Dot):
+        for item in term:
+            term_variables(item, variables)
+    elif isinstance(term, Bar):
+        term_variables(term.head, variables)
+        term_variables(term.tail, variables)
+    return variables
+
+
+def variant_key(term, numbering=None):
+    if numbering is None:
+        numbering = {}
+    # Arithmetic - подкласс Variable, поэтому проверяется раньше
+    if isinstance(term, Arithmetic):
+        return ('is', variant_key(term.target, numbering),
+                expression_key(term.bound_expression(), numbering))
+    if isinstance(term, Logic):
+        return ('?', expression_key(term.bound_expression(), numbering))
+    if isinstance(term, Variable):
+        number = numbering.get(id(term), None)
+        if number is None:
+            number = len(numbering)
+            numbering[id(term)] = number
+        return ('$VAR', number)
+    if isinstance(term, Term):
+        if not term.args:
+            return (type(term).__name__, term.key)
+        return (term.pred, tuple(variant_key(arg, numbering) for arg in term.args))
+    if isinstance(term, Dot):
+        return ('.', tuple(variant_key(item, numbering) for item in term))
+    if isinstance(term, Bar):
+        return ('|', variant_key(term.head, numbering), variant_key(term.tail, numbering))
+    return ('?', str(term))
+
+
+def expression_key(expression, numbering):
+    if isinstance(expression, BinaryExpression):
+        return (expression.operand,
+                expression_key(expression.left, numbering),
+                expression_key(expression.right, numbering))
+    return variant_key(expression.exp, numbering)
+
+
+def fresh_variant(term):
+    variables = term_variables(term)
+    if not variables:
+        return term
+    return term.substitute({var: Variable(var.name) for var in variables})
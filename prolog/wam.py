@@ -0,0 +1,838 @@
+from weakref import WeakKeyDictionary
+from .types import Term, Arithmetic, number_key
+from .interpreter import Rule
+from .trail import TrailEngine, ClauseCompiler, Ref, Struct, Slot, Skeleton, \
+    Anonymous, ARITHMETIC, COMPARISON, deref
+
+
+class Reg:
+    __slots__ = ('permanent', 'index')
+
+    def __init__(self, permanent, index):
+        self.permanent = permanent  # True - Y-регистр окружения, иначе X-регистр
+        self.index = index
+
+    def __str__(self):
+        return f'{"Y" if self.permanent else "X"}{self.index}'
+
+    def __repr__(self):
+        return str(self)
+
+
+class Procedure:
+    __slots__ = ('code', 'size', 'arity', 'starts', 'buckets', 'tables')
+
+    def __init__(self, code, size, arity=0):
+        self.code = code  # поток инструкций
+        self.size = size  # сколько X-регистров нужно
+        self.arity = arity
+        self.starts = []    # адреса try_me_else/retry_me_else/trust_me
+        self.buckets = {}   # ключ первого аргумента -> адреса кода подходящих клауз
+        self.tables = None  # (константы, структуры) из switch_on_term
+
+    @property
+    def indexed(self):
+        return self.tables is not None
+
+
+class Environment:
+    __slots__ = ('y', 'ce', 'ccode', 'cpc', 'cut')
+
+    def __init__(self, size, ce, ccode, cpc, cut):
+        self.y = [None] * size  # постоянные переменные
+        self.ce = ce            # окружение вызывающей клаузы
+        self.ccode = ccode      # продолжение: код и адрес возврата
+        self.cpc = cpc
+        self.cut = cut          # высота стека точек выбора при вызове
+
+
+class ChoicePoint:
+    __slots__ = ('code', 'alt', 'limit', 'args', 'e', 'ccode', 'cpc', 'b0', 'mark', 'clock')
+
+    def __init__(self, code, alt, args, e, ccode, cpc, b0, mark, clock):
+        self.code = code
+        self.alt = alt    # адрес следующей альтернативы
+        self.limit = len(code)  # клаузы, дописанные после вызова, не видны
+        self.args = args  # сохранённые регистры аргументов
+        self.e = e
+        self.ccode = ccode
+        self.cpc = cpc
+        self.b0 = b0
+        self.mark = mark
+        self.clock = clock
+
+
+def goal_templates(goal):
+    kind = goal[0]
+    if kind == 'call' or kind == 'asserta' or kind == 'assertz' or kind == 'retract':
+        return [goal[1]]
+    if kind == 'is':
+        return [goal[1], goal[2]]
+    if kind == 'compare':
+        return [goal[2], goal[3]]
+    if kind == 'write':
+        return goal[1]
+    return []
+
+
+def template_slots(template, slots):
+    kind = type(template)
+    if kind is Slot:
+        slots.append(template)
+    elif kind is Skeleton:
+        for arg in template.args:
+            template_slots(arg, slots)
+    elif kind is tuple:
+        template_slots(template[1], slots)
+        template_slots(template[2], slots)
+    return slots
+
+
+def is_compound(template):
+    return type(template) is Skeleton or \
+        (type(template) is Struct and len(template.args) > 0)
+
+
+def first_key(template):
+    kind = type(template)
+    if kind is Slot or kind is Anonymous:
+        return None
+    if kind is Skeleton or kind is Struct:
+        return template.key
+    return number_key(template)
+
+
+class ClauseWriter:
+    def __init__(self, clause, query=False):
+        self.clause = clause
+        self.query = query
+        self.code = []
+        self.registers = {}  # номер слота -> Reg
+        self.seen = set()    # слоты, уже получившие значение
+        self.permanent = self.classify()
+        arities = [len(goal[1].args) for goal in clause.body if goal[0] == 'call']
+        self.calls = len(arities)
+        if type(clause.head) is Skeleton or type(clause.head) is Struct:
+            arities.append(len(clause.head.args))
+        self.size = max(arities, default=0)  # временные регистры идут после аргументов
+
+    def classify(self):
+        # переменная постоянна, если встречается больше чем в одном куске тела
+        chunks = {}
+        if not self.query:
+            for slot in template_slots(self.clause.head, []):
+                chunks.setdefault(slot.index, set()).add(0)
+        chunk = 0
+        for goal in self.clause.body:
+            slots = []
+            for template in goal_templates(goal):
+                template_slots(template, slots)
+            for slot in slots:
+                chunks.setdefault(slot.index, set()).add(chunk)
+            if goal[0] == 'call':
+                chunk += 1
+        if self.query:
+            return set(range(len(self.clause.names)))
+        return {index for index, used in chunks.items() if len(used) > 1}
+
+    def temp(self):
+        self.size += 1
+        return self.size - 1
+
+    def register(self, slot):
+        reg = self.registers.get(slot.index, None)
+        if reg is None:
+            if slot.index in self.permanent:
+                reg = Reg(True, len([r for r in self.registers.values() if r.permanent]))
+            else:
+                reg = Reg(False, self.temp())
+            self.registers[slot.index] = reg
+        return reg
+
+    def first(self, slot):
+        if slot.index in self.seen:
+            return False
+        self.seen.add(slot.index)
+        return True
+
+    def emit(self, *instruction):
+        self.code.append(instruction)
+
+    def variable(self, prefix, slot, *operands):
+        first = self.first(slot)
+        reg = self.register(slot)
+        kind = 'y' if reg.permanent else 'x'
+        if first:
+            self.emit(f'{prefix}_{kind}_variable', reg.index, *operands, slot.name)
+        else:
+            self.emit(f'{prefix}_{kind}_value', reg.index, *operands)
+
+    def compile(self):
+        body = self.clause.body
+        needs_env = self.query or bool(self.permanent) or self.calls > 1 or \
+            (self.calls == 1 and body[-1][0] != 'call')
+        if needs_env:
+            self.emit('allocate', len(self.permanent))
+        if self.query:
+            for index, name in enumerate(self.clause.names):
+                self.registers[index] = Reg(True, index)
+                self.seen.add(index)
+                self.emit('init_y', index, name)
+        else:
+            self.head(self.clause.head)
+
+        for number, goal in enumerate(body):
+            last = number == len(body) - 1
+            kind = goal[0]
+            if kind == 'call':
+                self.call(goal[1], last and not self.query, needs_env)
+            elif kind == 'cut':
+                self.emit('cut' if needs_env else 'neck_cut')
+            else:
+                self.builtin(goal)
+
+        if self.query:
+            self.emit('halt')
+        elif not body or body[-1][0] != 'call':
+            if needs_env:
+                self.emit('deallocate')
+            self.emit('proceed')
+        return self.code
+
+    def head(self, head):
+        if type(head) is not Skeleton and type(head) is not Struct:
+            return
+        pending = []
+        for i, arg in enumerate(head.args):
+            self.get(arg, i, pending)
+        while pending:
+            reg, template = pending.pop(0)
+            self.emit('get_structure', template.name, template.key, len(template.args), reg)
+            for arg in template.args:
+                self.unify(arg, pending)
+
+    def get(self, template, i, pending):
+        kind = type(template)
+        if kind is Slot:
+            self.variable('get', template, i)
+        elif kind is Anonymous:
+            pass
+        elif is_compound(template):
+            pending.append((i, template))
+        else:
+            self.emit('get_constant', template, i)
+
+    def unify(self, template, pending):
+        kind = type(template)
+        if kind is Slot:
+            self.variable('unify', template)
+        elif kind is Anonymous:
+            self.emit('unify_void', '_')
+        elif is_compound(template):
+            reg = self.temp()
+            self.emit('unify_x_variable', reg, '_')
+            pending.append((reg, template))
+        else:
+            self.emit('unify_constant', template)
+
+    def call(self, goal, last, needs_env):
+        if type(goal) is not Skeleton and type(goal) is not Struct:
+            raise Exception(f'Type error: callable expected, got {goal}')
+        for i, arg in enumerate(goal.args):
+            self.put(arg, i)
+        if not last:
+            self.emit('call', goal.key)
+            return
+        if needs_env:
+            self.emit('deallocate')
+        self.emit('execute', goal.key)
+
+    def put(self, template, i):
+        kind = type(template)
+        if kind is Slot:
+            self.variable('put', template, i)
+        elif kind is Anonymous:
+            self.emit('put_void', i, '_')
+        elif kind is Skeleton:
+            self.build(template, i)
+        else:
+            # константы и основные структуры разделяются без копирования
+            self.emit('put_constant', template, i)
+
+    def build(self, template, target):
+        inner = {}
+        for position, arg in enumerate(template.args):
+            if type(arg) is Skeleton:
+                inner[position] = self.temp()
+                self.build(arg, inner[position])
+        self.emit('put_structure', template.name, template.key, len(template.args), target)
+        for position, arg in enumerate(template.args):
+            kind = type(arg)
+            if kind is Slot:
+                self.variable('unify', arg)
+            elif kind is Anonymous:
+                self.emit('unify_void', '_')
+            elif kind is Skeleton:
+                self.emit('unify_x_value', inner[position])
+            else:
+                self.emit('unify_constant', arg)
+
+    def operand(self, template):
+        kind = type(template)
+        if kind is Slot:
+            return self.registers[template.index]
+        if kind is Skeleton:
+            return Skeleton(template.name, tuple(map(self.operand, template.args)))
+        if kind is tuple:
+            return (template[0], self.operand(template[1]), self.operand(template[2]))
+        return template
+
+    def builtin(self, goal):
+        for template in goal_templates(goal):
+            for slot in template_slots(template, []):
+                if self.first(slot):
+                    reg = self.register(slot)
+                    self.emit('init_y' if reg.permanent else 'init_x', reg.index, slot.name)
+        kind = goal[0]
+        if kind == 'is':
+            self.emit('is', self.operand(goal[1]), self.operand(goal[2]))
+        elif kind == 'compare':
+            self.emit('compare', goal[1], self.operand(goal[2]), self.operand(goal[3]))
+        elif kind == 'write':
+            self.emit('write', [self.operand(arg) for arg in goal[1]])
+        elif kind == 'text' or kind == 'fail':
+            self.emit(*goal)
+        else:
+            self.emit(kind, self.operand(goal[1]))
+
+
+class WamCompiler:
+    def __init__(self, engine):
+        self.engine = engine
+        self.clauses = WeakKeyDictionary()  # правило -> (инструкции, регистры)
+
+    def clause(self, rule):
+        entry = self.clauses.get(rule, None)
+        if entry is None:
+            writer = ClauseWriter(self.engine.compile(rule))
+            entry = (writer.compile(), writer.size)
+            self.clauses[rule] = entry
+        return entry
+
+    def procedure(self, rules, arity):
+        entries = [self.clause(rule) for rule in rules]
+        size = max([size for _, size in entries], default=arity)
+        code = []
+        procedure = Procedure(code, size, arity)
+        if not entries:
+            code.append(('fail',))
+            return procedure
+
+        indexed = arity > 0 and len(entries) > 1
+        if indexed:
+            code.append(None)  # switch_on_term, адреса известны после раскладки
+
+        starts = procedure.starts
+        labels = []  # адреса кода клауз
+        for number, (body, _) in enumerate(entries):
+            if len(entries) > 1:
+                starts.append(len(code))
+                code.append(None)
+            labels.append(len(code))
+            code.extend(body)
+        for number, start in enumerate(starts):
+            if number == 0:
+                code[start] = ('try_me_else', starts[1], arity)
+            elif number == len(starts) - 1:
+                code[start] = ('trust_me',)
+            else:
+                code[start] = ('retry_me_else', starts[number + 1])
+
+        if indexed:
+            firsts = [self.engine.compile(rule).head.args[0] for rule in rules]
+            code[0] = self.switch(procedure, firsts, labels)
+        return procedure
+
+    def sequence(self, code, sequence, arity):
+        # адрес, с которого перебираются клаузы корзины
+        if not sequence:
+            code.append(('fail',))
+            return len(code) - 1
+        if len(sequence) == 1:
+            return sequence[0]
+        label = len(code)
+        code.append(('try', sequence[0], arity))
+        for item in sequence[1:-1]:
+            code.append(('retry', item))
+        code.append(('trust', sequence[-1]))
+        return label
+
+    def switch(self, procedure, firsts, labels):
+        code = procedure.code
+        arity = procedure.arity
+        keys = [first_key(first) for first in firsts]
+        buckets = procedure.buckets
+        sequences = {}
+
+        def bucket(key):
+            sequence = tuple(
+                label for label, item in zip(labels, keys)
+                if item is None or item == key
+            )
+            buckets[key] = list(sequence)
+            label = sequences.get(sequence, None)
+            if label is None:
+                label = self.sequence(code, sequence, arity)
+                sequences[sequence] = label
+            return label
+
+        default = bucket(None)
+        constants = {}
+        structures = {}
+        for key, first in zip(keys, firsts):
+            if key is None:
+                continue
+            if is_compound(first):
+                structures.setdefault(key, None)
+            else:
+                constants.setdefault(key, None)
+        procedure.tables = (constants, structures)
+
+        targets = []
+        for table, name in ((constants, 'switch_on_constant'), (structures, 'switch_on_structure')):
+            if not table:
+                targets.append(default)
+                continue
+            for key in table:
+                table[key] = bucket(key)
+            targets.append(len(code))
+            code.append((name, table, default))
+        return ('switch_on_term', procedure.starts[0], targets[0], targets[1])
+
+    def append(self, procedure, rule):
+        # assertz: код клаузы дописывается в конец потока, цепочка
+        # try_me_else и таблицы switch правятся на месте. Уже начатые вызовы
+        # новую клаузу не видят: их точки выбора помнят длину кода при вызове.
+        # None - нужна полная сборка (мало клауз или первый аргумент новой
+        # клаузы - переменная, которая попадает во все корзины)
+        if len(procedure.starts) < 2:
+            return None
+        first = None
+        if procedure.indexed:
+            first = self.engine.compile(rule).head.args[0]
+            if first_key(first) is None:
+                return None
+        body, size = self.clause(rule)
+        code = procedure.code
+        start = len(code)
+        code.append(('trust_me',))
+        label = len(code)
+        code.extend(body)
+        code[procedure.starts[-1]] = ('retry_me_else', start)
+        procedure.starts.append(start)
+        procedure.size = max(procedure.size, size)
+        if procedure.indexed:
+            self.extend_switch(procedure, first, label)
+        return procedure
+
+    def extend_switch(self, procedure, first, label):
+        code = procedure.code
+        key = first_key(first)
+        sequence = procedure.buckets.get(key, None)
+        if sequence is None:
+            sequence = list(procedure.buckets[None])
+            procedure.buckets[key] = sequence
+        sequence.append(label)
+        constants, structures = procedure.tables
+        table = structures if is_compound(first) else constants
+        table[key] = self.sequence(code, sequence, procedure.arity)
+        if len(table) == 1:
+            # первая клауза этого вида: switch_on_term пока ведёт прямо в
+            # корзину клауз с переменной, теперь - через новую таблицу
+            switch = list(code[0])
+            position = 3 if table is structures else 2
+            name = 'switch_on_structure' if table is structures else 'switch_on_constant'
+            code.append((name, table, switch[position]))
+            switch[position] = len(code) - 1
+            code[0] = tuple(switch)
+
+
+class WamEngine(TrailEngine):
+    def __init__(self, database):
+        super().__init__(database)
+        self.compiler = WamCompiler(self)
+        self.procedures = {}  # функтор -> (индекс предиката, версия, Procedure)
+        self.clock = 0  # растёт с каждой точкой выбора, для условной записи в след
+
+    def bind(self, ref, value):
+        ref.value = value
+        choicepoints = self.choicepoints
+        if choicepoints and ref.stamp < choicepoints[-1].clock:
+            self.trail.append(ref)
+
+    def procedure(self, key):
+        store = self.database.store
+        predicate = store.predicate(key)
+        if predicate is None:
+            return None
+        entry = self.procedures.get(key, None)
+        if entry is not None and entry[0] is predicate:
+            if entry[1] == predicate.version:
+                return entry[2]
+            if entry[1] + 1 == predicate.version and predicate.appended is not None:
+                procedure = self.compiler.append(entry[2], predicate.appended.rule)
+                if procedure is not None:
+                    self.procedures[key] = (predicate, predicate.version, procedure)
+                    return procedure
+        generation = store.generation
+        rules = [clause.rule for clause in predicate if clause.visible(generation)]
+        procedure = self.compiler.procedure(rules, key[1])
+        self.procedures[key] = (predicate, predicate.version, procedure)
+        return procedure
+
+    def build(self, template, x, e):
+        kind = type(template)
+        if kind is Reg:
+            if template.permanent:
+                return e.y[template.index]
+            return x[template.index]
+        if kind is Skeleton:
+            return Struct(
+                template.name,
+                tuple(self.build(arg, x, e) for arg in template.args),
+                template.key
+            )
+        if kind is Anonymous:
+            return Ref('_', self.clock)
+        return template
+
+    def calculate(self, expr, x, e):
+        if type(expr) is tuple:
+            operand, left, right = expr
+            function = ARITHMETIC.get(operand, None)
+            if function is None:
+                raise Exception(f'Invalid binary operand {operand}')
+            return function(
+                self.calculate(left, x, e),
+                self.calculate(right, x, e)
+            )
+        value = deref(self.build(expr, x, e))
+        if type(value) is Ref or type(value) is Struct:
+            raise Exception(f'Arithmetic: {self.to_term(value)} is not a number')
+        return value
+
+    def run(self, query, answer):
+        code = query.code
+        pc = 0
+        x = [None] * query.size
+        e = None
+        ccode = None
+        cpc = 0
+        b0 = 0
+        args = None   # аргументы разбираемой или строящейся структуры
+        s = 0
+        write = False
+        trail = self.trail = []
+        choicepoints = self.choicepoints = []
+        unify = self.unify
+        bind = self.bind
+
+        while True:
+            instruction = code[pc]
+            op = instruction[0]
+
+            if op == 'get_x_variable':
+                x[instruction[1]] = x[instruction[2]]
+                pc += 1
+                continue
+            elif op == 'get_y_variable':
+                e.y[instruction[1]] = x[instruction[2]]
+                pc += 1
+                continue
+            elif op == 'get_x_value':
+                if unify(x[instruction[1]], x[instruction[2]]):
+                    pc += 1
+                    continue
+            elif op == 'get_y_value':
+                if unify(e.y[instruction[1]], x[instruction[2]]):
+                    pc += 1
+                    continue
+            elif op == 'get_constant':
+                constant = instruction[1]
+                value = deref(x[instruction[2]])
+                if type(value) is Ref:
+                    bind(value, constant)
+                    pc += 1
+                    continue
+                if type(constant) is Struct:
+                    if type(value) is Struct and value.key == constant.key:
+                        pc += 1
+                        continue
+                elif type(value) is type(constant) and value == constant:
+                    pc += 1
+                    continue
+            elif op == 'get_structure':
+                value = deref(x[instruction[4]])
+                if type(value) is Ref:
+                    args = [None] * instruction[3]
+                    bind(value, Struct(instruction[1], args, instruction[2]))
+                    s = 0
+                    write = True
+                    pc += 1
+                    continue
+                if type(value) is Struct and value.key == instruction[2]:
+                    args = value.args
+                    s = 0
+                    write = False
+                    pc += 1
+                    continue
+
+            elif op == 'unify_x_variable':
+                if write:
+                    args[s] = x[instruction[1]] = Ref(instruction[2], self.clock)
+                else:
+                    x[instruction[1]] = args[s]
+                s += 1
+                pc += 1
+                continue
+            elif op == 'unify_y_variable':
+                if write:
+                    args[s] = e.y[instruction[1]] = Ref(instruction[2], self.clock)
+                else:
+                    e.y[instruction[1]] = args[s]
+                s += 1
+                pc += 1
+                continue
+            elif op == 'unify_x_value':
+                if write:
+                    args[s] = x[instruction[1]]
+                    s += 1
+                    pc += 1
+                    continue
+                if unify(x[instruction[1]], args[s]):
+                    s += 1
+                    pc += 1
+                    continue
+            elif op == 'unify_y_value':
+                if write:
+                    args[s] = e.y[instruction[1]]
+                    s += 1
+                    pc += 1
+                    continue
+                if unify(e.y[instruction[1]], args[s]):
+                    s += 1
+                    pc += 1
+                    continue
+            elif op == 'unify_constant':
+                constant = instruction[1]
+                if write:
+                    args[s] = constant
+                    s += 1
+                    pc += 1
+                    continue
+                value = deref(args[s])
+                s += 1
+                if type(value) is Ref:
+                    bind(value, constant)
+                    pc += 1
+                    continue
+                if type(constant) is Struct:
+                    if type(value) is Struct and value.key == constant.key:
+                        pc += 1
+                        continue
+                elif type(value) is type(constant) and value == constant:
+                    pc += 1
+                    continue
+            elif op == 'unify_void':
+                if write:
+                    args[s] = Ref(instruction[1], self.clock)
+                s += 1
+                pc += 1
+                continue
+
+            elif op == 'put_x_variable':
+                x[instruction[2]] = x[instruction[1]] = Ref(instruction[3], self.clock)
+                pc += 1
+                continue
+            elif op == 'put_y_variable':
+                x[instruction[2]] = e.y[instruction[1]] = Ref(instruction[3], self.clock)
+                pc += 1
+                continue
+            elif op == 'put_x_value':
+                x[instruction[2]] = x[instruction[1]]
+                pc += 1
+                continue
+            elif op == 'put_y_value':
+                x[instruction[2]] = e.y[instruction[1]]
+                pc += 1
+                continue
+            elif op == 'put_void':
+                x[instruction[1]] = Ref(instruction[2], self.clock)
+                pc += 1
+                continue
+            elif op == 'put_constant':
+                x[instruction[2]] = instruction[1]
+                pc += 1
+                continue
+            elif op == 'put_structure':
+                args = [None] * instruction[3]
+                x[instruction[4]] = Struct(instruction[1], args, instruction[2])
+                s = 0
+                write = True
+                pc += 1
+                continue
+
+            elif op == 'allocate':
+                e = Environment(instruction[1], e, ccode, cpc, b0)
+                pc += 1
+                continue
+            elif op == 'deallocate':
+                ccode = e.ccode
+                cpc = e.cpc
+                e = e.ce
+                pc += 1
+                continue
+            elif op == 'call' or op == 'execute':
+                procedure = self.procedure(instruction[1])
+                if procedure is not None:
+                    if op == 'call':
+                        ccode = code
+                        cpc = pc + 1
+                    if len(x) < procedure.size:
+                        x.extend([None] * (procedure.size - len(x)))
+                    b0 = len(choicepoints)
+                    code = procedure.code
+                    pc = 0
+                    continue
+            elif op == 'proceed':
+                code = ccode
+                pc = cpc
+                continue
+
+            elif op == 'try_me_else' or op == 'try':
+                self.clock += 1
+                alt = instruction[1] if op == 'try_me_else' else pc + 1
+                choicepoints.append(ChoicePoint(
+                    code, alt, x[:instruction[2]], e, ccode, cpc, b0,
+                    len(trail), self.clock
+                ))
+                pc = pc + 1 if op == 'try_me_else' else instruction[1]
+                continue
+            elif op == 'retry_me_else':
+                if instruction[1] < choicepoints[-1].limit:
+                    choicepoints[-1].alt = instruction[1]
+                else:
+                    choicepoints.pop()  # дальше только клаузы, дописанные после вызова
+                pc += 1
+                continue
+            elif op == 'retry':
+                choicepoints[-1].alt = pc + 1
+                pc = instruction[1]
+                continue
+            elif op == 'trust_me':
+                choicepoints.pop()
+                pc += 1
+                continue
+            elif op == 'trust':
+                choicepoints.pop()
+                pc = instruction[1]
+                continue
+            elif op == 'switch_on_term':
+                value = deref(x[0])
+                if type(value) is Ref:
+                    pc = instruction[1]
+                elif type(value) is Struct and value.args:
+                    pc = instruction[3]
+                else:
+                    pc = instruction[2]
+                continue
+            elif op == 'switch_on_constant':
+                value = deref(x[0])
+                key = value.key if type(value) is Struct else number_key(value)
+                pc = instruction[1].get(key, instruction[2])
+                continue
+            elif op == 'switch_on_structure':
+                pc = instruction[1].get(deref(x[0]).key, instruction[2])
+                continue
+            elif op == 'neck_cut':
+                del choicepoints[b0:]
+                pc += 1
+                continue
+            elif op == 'cut':
+                del choicepoints[e.cut:]
+                pc += 1
+                continue
+
+            elif op == 'init_x':
+                x[instruction[1]] = Ref(instruction[2], self.clock)
+                pc += 1
+                continue
+            elif op == 'init_y':
+                e.y[instruction[1]] = Ref(instruction[2], self.clock)
+                pc += 1
+                continue
+            elif op == 'is':
+                value = self.calculate(instruction[2], x, e)
+                if unify(self.build(instruction[1], x, e), value):
+                    pc += 1
+                    continue
+            elif op == 'compare':
+                left = self.calculate(instruction[2], x, e)
+                right = self.calculate(instruction[3], x, e)
+                if COMPARISON[instruction[1]](left, right):
+                    pc += 1
+                    continue
+            elif op == 'write':
+                for arg in instruction[1]:
+                    self.database.stream_write(str(self.to_term(self.build(arg, x, e))))
+                pc += 1
+                continue
+            elif op == 'text':
+                self.database.stream_write(instruction[1])
+                pc += 1
+                continue
+            elif op == 'asserta':
+                self.database.insert_rule_left(self.to_term(self.build(instruction[1], x, e)))
+                pc += 1
+                continue
+            elif op == 'assertz':
+                self.database.insert_rule_right(self.to_term(self.build(instruction[1], x, e)))
+                pc += 1
+                continue
+            elif op == 'retract':
+                if self.retract(self.build(instruction[1], x, e)):
+                    pc += 1
+                    continue
+            elif op == 'halt':
+                yield self.to_term(self.build(answer, x, e))
+            elif op != 'fail':
+                raise Exception(f'Unknown instruction {op}')
+
+            # неудача: возврат к последней точке выбора
+            if not choicepoints:
+                return
+            choicepoint = choicepoints[-1]
+            self.undo(choicepoint.mark)
+            x[:len(choicepoint.args)] = choicepoint.args
+            e = choicepoint.e
+            ccode = choicepoint.ccode
+            cpc = choicepoint.cpc
+            b0 = choicepoint.b0
+            code = choicepoint.code
+            pc = choicepoint.alt
+
+    def answers(self, query):
+        if isinstance(query, Arithmetic):
+            yield query.evaluate()
+            return
+
+        if isinstance(query, Rule):
+            clause = ClauseCompiler().compile(query)
+        elif isinstance(query, Term):
+            clause = ClauseCompiler().compile(Rule(query, query))
+        else:
+            clause = ClauseCompiler().compile(Rule(Term('##'), query))
+
+        writer = ClauseWriter(clause, query=True)
+        procedure = Procedure(writer.compile(), writer.size)
+        yield from self.run(procedure, writer.operand(clause.head))
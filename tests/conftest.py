@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from prolog.interpreter import Database
+from prolog.parser import Parser
+from prolog.scanner import Scanner
+from prolog.types import FALSE
+
+TESTS = os.path.dirname(__file__)
+
+
+def parse(text):
+    return Parser(Scanner(text).tokenize()).parse()
+
+
+def source(name):
+    with open(os.path.join(TESTS, name), encoding='utf8') as file:
+        return file.read()
+
+
+@pytest.fixture
+def consult():
+    # база из текстов программы и файлов tests/*.pl, по порядку
+    def make(*texts, **options):
+        text = '\n'.join(source(text) if text.endswith('.pl') else text for text in texts)
+        return Database(parse(text), **options)
+    return make
+
+
+@pytest.fixture
+def ask():
+    # ответы на запрос строками, без FALSE
+    def run(database, text, limit=None):
+        query = Parser(Scanner(text).tokenize()).parse_query()
+        answers = []
+        for answer in database.execute(query):
+            if isinstance(answer, FALSE):
+                continue
+            answers.append(str(answer))
+            if limit is not None and len(answers) == limit:
+                break
+        return answers
+    return run
@@ -0,0 +1,10 @@
+% Таблирование: левая рекурсия завершается
+:- table path/2.
+
+path(X, Y) :- path(X, Z), edge(Z, Y).
+path(X, Y) :- edge(X, Y).
+
+edge(a, b).
+edge(b, c).
+edge(c, a).
+edge(c, d).
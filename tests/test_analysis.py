@@ -0,0 +1,70 @@
+from prolog.analysis import analyse, SEMIDET, NONDET
+
+PROGRAM = '''
+p(1).
+q(a, 1).
+q(b, 2).
+r(X, Y) :- q(X, Z), p(Z), Y is Z + 1.
+s(X) :- r(X, _), write(X).
+t(X) :- p(X), !.
+t(X) :- q(X, _).
+'''
+
+
+def summary(table):
+    return {
+        key: (info.determinism, info.exclusive, info.modes, info.facts, info.pure,
+              [str(rule) for rule in info.clauses])
+        for key, info in table.items()
+    }
+
+
+def test_initial_analysis(consult):
+    database = consult(PROGRAM)
+    table = database.analysis()
+    infos = {info.name: info for info in table.values()}
+    assert infos['p'].determinism == SEMIDET and infos['p'].facts
+    assert infos['q'].determinism == NONDET and infos['q'].exclusive == (0, 1)
+    assert not infos['s'].pure and infos['r'].pure
+    assert infos['t'].determinism == NONDET
+
+
+def test_incremental_analysis_matches_full(consult):
+    database = consult(PROGRAM)
+    database.analysis()
+    changes = [
+        ('assertz', 'p(2).'),
+        ('assertz', 'q(c, 1).'),
+        ('asserta', 'q(a, 3).'),
+        ('assertz', 'p(X) :- q(X, 1).'),
+        ('retract', 'q(a, 1).'),
+        ('retract', 'p(1).'),
+        ('assertz', 'u(1).'),
+        ('assertz', 'v(X) :- u(X).'),
+        ('retract', 'u(1).'),
+        ('retract', 'q(a, 3).'),
+        ('retract', 'q(b, 2).'),
+        ('retract', 'q(c, 1).'),
+    ]
+    for action, text in changes:
+        rule = consult(text).rules[0]
+        if action == 'assertz':
+            database.insert_rule_right(rule)
+        elif action == 'asserta':
+            database.insert_rule_left(rule)
+        else:
+            database.remove_rule(rule.head)
+        assert summary(database.analysis()) == summary(analyse(database.store.visible()))
+
+
+def test_facts_update_in_place(consult):
+    database = consult('p(1).\nw(X) :- p(X).\n')
+    table = database.analysis()
+    key = database.rules[0].head.key
+    info = table[key]
+    assert info.determinism == SEMIDET
+    database.insert_rule_right(consult('p(2).').rules[0])
+    assert database.analysis()[key] is info
+    assert info.determinism == NONDET and info.exclusive == (0,)
+    database.insert_rule_right(consult('p(2).').rules[0])
+    assert database.analysis()[key].exclusive == ()
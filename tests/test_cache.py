@@ -0,0 +1,78 @@
+import pytest
+
+QUERIES = ['path(a, X).', 'path(X, d).', 'path(a, X).', 'edge(c, X).', 'reach(a, X).',
+           'path(b, X).', 'reach(a, X).']
+
+REACH = '''
+reach(X, Y) :- path(X, Y).
+'''
+
+
+def run(consult, ask, **options):
+    database = consult('path.pl', REACH, **options)
+    return database, [ask(database, text) for text in QUERIES]
+
+
+def test_cached_tabled_answers_match_uncached(consult, ask):
+    _, plain = run(consult, ask)
+    database, cached = run(consult, ask, cache_size=10)
+    assert cached == plain
+    assert plain[0] == ['path(a, b)', 'path(a, c)', 'path(a, a)', 'path(a, d)']
+
+
+def test_tabled_goals_are_not_cached(consult, ask):
+    database, _ = run(consult, ask, cache_size=10)
+    assert len(database.cache) == 1  # только edge(c, X)
+
+
+def test_cache_hits_and_invalidation(consult, ask):
+    database = consult('older.pl', cache_size=10)
+    expected = ['older(masha, sasha, rule)', 'older(masha, julia, rule)']
+    assert ask(database, 'older(masha, Y, rule).') == expected
+    assert ask(database, 'older(masha, Y, rule).') == expected
+    assert database.cache.hits == 1
+    fact = 'older(sasha, petya, fact).'
+    database.insert_rule_right(consult(fact).rules[0])
+    changed = ask(consult('older.pl', fact), 'older(masha, Y, rule).')
+    assert changed != expected
+    assert ask(database, 'older(masha, Y, rule).') == changed
+
+
+@pytest.mark.parametrize('limit', [1, 2])
+def test_partly_consumed_answers_are_not_cached(consult, ask, limit):
+    database = consult('older.pl', cache_size=10)
+    ask(database, 'older(X, Y, fact).', limit=limit)
+    assert len(database.cache) == 0
+
+
+ARITHMETIC = '''
+r(1).
+r(2).
+r(3).
+'''
+
+
+def test_arithmetic_goals_are_part_of_the_key(consult, ask):
+    # is/2 и сравнения входят в ключ своими выражениями
+    queries = ['r(X), Y is X + 1, Y > 3.', 'r(X), Y is X * 5, Y > 3.',
+               'r(X), Y is X * 5, Y > 12.', 'r(X), Y is X + 1, Y > 3.']
+    plain = consult(ARITHMETIC)
+    database = consult(ARITHMETIC, cache_size=10)
+    expected = [ask(plain, text) for text in queries]
+    assert [ask(database, text) for text in queries] == expected
+    assert [len(answers) for answers in expected] == [1, 3, 1, 1]
+    assert len(database.cache) == 4  # r(X) и три разных конъюнкции
+
+
+SHARED = '''
+p(f(Z)).
+p(g).
+eq(A, A).
+w(X, Y) :- p(X), p(Y), eq(X, f(a)), eq(Y, f(b)).
+'''
+
+
+def test_hits_rename_answers_apart(consult, ask):
+    database = consult(SHARED, cache_size=10)
+    assert ask(database, 'p(X).') == ask(consult(SHARED), 'p(X).')
+    assert ask(database, 'w(A, B).') == ['w(f(a), f(b))']
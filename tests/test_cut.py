@@ -0,0 +1,62 @@
+import pytest
+
+from prolog.interpreter import CutBarrier
+
+CUTS = '''
+max(X, Y, X) :- X >= Y, !.
+max(X, Y, Y).
+item(1).
+item(2).
+item(3).
+first(X) :- item(X), !.
+count(N, N) :- N >= 3, !.
+count(N, M) :- K is N + 1, count(K, M).
+pick(X) :- item(X), X > 1, !.
+pick(0).
+outer(X, Y) :- item(X), first(Y).
+guard(X) :- !, item(X).
+guard(none).
+'''
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('max(3, 1, M).', ['max(3, 1, 3)']),
+    ('max(1, 3, M).', ['max(1, 3, 3)']),
+    ('count(0, M).', ['count(0, 3)']),
+    ('first(X).', ['first(1)']),
+    ('pick(X).', ['pick(2)']),
+])
+def test_guard_and_cut(consult, ask, query, expected):
+    assert ask(consult(CUTS), query) == expected
+
+
+def test_cut_is_local_to_its_clause(consult, ask):
+    # отсечение в first/1 не трогает альтернативы item/1 вызывающей клаузы
+    assert ask(consult(CUTS), 'outer(X, Y).') == [
+        'outer(1, 1)', 'outer(2, 1)', 'outer(3, 1)'
+    ]
+
+
+def test_cut_keeps_goals_after_it(consult, ask):
+    # первая цель - отсечение: вторая клауза отброшена, item/1 перебирается
+    assert ask(consult(CUTS), 'guard(X).') == ['guard(1)', 'guard(2)', 'guard(3)']
+
+
+def test_cut_in_query(consult, ask):
+    assert ask(consult(CUTS), 'item(X), !.') == ['##(1)']
+
+
+def test_barrier_closes_alternatives():
+    tried = []
+
+    def clauses():
+        for clause in ('a', 'b', 'c'):
+            tried.append(clause)
+            yield clause
+
+    alternatives = clauses()
+    barrier = CutBarrier(alternatives)
+    assert next(alternatives) == 'a'
+    barrier.cut()
+    assert list(alternatives) == []
+    assert tried == ['a']
@@ -0,0 +1,151 @@
+import pytest
+
+from prolog import magic
+
+EDGES = '''
+edge(a, b).
+edge(b, c).
+edge(c, a).
+edge(c, d).
+edge(d, e).
+'''
+
+LEFT = EDGES + '''
+path(X, Y) :- path(X, Z), edge(Z, Y).
+path(X, Y) :- edge(X, Y).
+'''
+
+RIGHT = EDGES + '''
+path(X, Y) :- edge(X, Y).
+path(X, Y) :- edge(X, Z), path(Z, Y).
+'''
+
+MUTUAL = '''
+next(n0, n1).
+next(n1, n2).
+next(n2, n3).
+next(n3, n4).
+even(n0).
+even(Y) :- odd(X), next(X, Y).
+odd(Y) :- even(X), next(X, Y).
+'''
+
+SAME = '''
+up(a, e).
+up(b, e).
+up(c, f).
+up(e, g).
+up(f, g).
+flat(g, g).
+down(e, a).
+down(e, b).
+down(f, c).
+down(g, e).
+down(g, f).
+sg(X, Y) :- flat(X, Y).
+sg(X, Y) :- up(X, U), sg(U, V), down(V, Y).
+'''
+
+TABLES = {
+    LEFT: ':- table path/2.',
+    RIGHT: ':- table path/2.',
+    MUTUAL: ':- table even/1.\n:- table odd/1.',
+    SAME: ':- table sg/2.',
+}
+
+
+def answers(consult, ask, program, text):
+    tabled = sorted(ask(consult(TABLES[program], program), text))
+    datalog = sorted(ask(consult(program, datalog=True), text))
+    return tabled, datalog
+
+
+@pytest.mark.parametrize('program, text', [
+    (LEFT, 'path(X, Y).'),
+    (RIGHT, 'path(X, Y).'),
+    (MUTUAL, 'even(X).'),
+    (MUTUAL, 'odd(X).'),
+    (SAME, 'sg(X, Y).'),
+])
+def test_semi_naive_matches_tabling(consult, ask, program, text):
+    tabled, datalog = answers(consult, ask, program, text)
+    assert tabled == datalog
+    assert datalog
+
+
+@pytest.mark.parametrize('program, text', [
+    (LEFT, 'path(a, X).'),
+    (LEFT, 'path(X, a).'),
+    (LEFT, 'path(d, e).'),
+    (LEFT, 'path(e, X).'),
+    (RIGHT, 'path(b, X).'),
+    (MUTUAL, 'even(n4).'),
+    (MUTUAL, 'odd(n4).'),
+    (SAME, 'sg(a, Y).'),
+    (SAME, 'sg(X, c).'),
+])
+def test_magic_sets_match_tabling(consult, ask, program, text):
+    tabled, datalog = answers(consult, ask, program, text)
+    assert tabled == datalog
+
+
+def test_bound_query_does_not_build_full_extension(consult, ask, monkeypatch):
+    rewrites = [0]
+    rewrite = magic.rewrite
+
+    def counting(*args):
+        rewrites[0] += 1
+        return rewrite(*args)
+
+    monkeypatch.setattr(magic, 'rewrite', counting)
+    database = consult(LEFT, datalog=True)
+    assert sorted(ask(database, 'path(d, X).')) == ['path(d, e)']
+    assert rewrites[0] == 1
+    assert database.datalog_program().full is None
+
+
+def edit(database, consult, changes):
+    for sign, text in changes:
+        [rule] = consult(text).rules
+        if sign == '+':
+            database.insert_rule_right(rule)
+        else:
+            database.remove_rule(rule.head)
+
+
+@pytest.mark.parametrize('changes', [
+    [('+', 'edge(e, f).')],
+    [('-', 'edge(c, d).')],
+    [('-', 'edge(c, a).')],
+    [('-', 'edge(a, b).'), ('+', 'edge(a, c).')],
+    [('+', 'edge(e, a).'), ('-', 'edge(d, e).'), ('-', 'edge(b, c).')],
+])
+def test_maintenance_matches_fresh_tabling(consult, ask, changes):
+    database = consult(LEFT, datalog=True)
+    assert ask(database, 'path(X, Y).')
+    program = database.datalog_program()
+    edit(database, consult, changes)
+    # материализация обновлена на месте, а не построена заново
+    assert database.datalog_program() is program
+    fresh = consult(TABLES[LEFT], LEFT)
+    edit(fresh, consult, changes)
+    assert sorted(ask(database, 'path(X, Y).')) == sorted(ask(fresh, 'path(X, Y).'))
+    assert sorted(ask(database, 'path(a, Y).')) == sorted(ask(fresh, 'path(a, Y).'))
+
+
+def test_duplicate_fact_survives_one_retract(consult, ask):
+    database = consult(LEFT, 'edge(d, e).', datalog=True)
+    assert 'path(a, e)' in ask(database, 'path(X, Y).')
+    edit(database, consult, [('-', 'edge(d, e).')])
+    assert 'path(a, e)' in ask(database, 'path(X, Y).')
+    edit(database, consult, [('-', 'edge(d, e).')])
+    assert 'path(a, e)' not in ask(database, 'path(X, Y).')
+
+
+def test_rule_change_rebuilds(consult, ask):
+    database = consult(LEFT, datalog=True)
+    assert ask(database, 'path(e, Y).') == []
+    program = database.datalog_program()
+    edit(database, consult, [('+', 'path(X, Y) :- edge(Y, X).')])
+    assert database.datalog_program() is not program
+    assert 'path(e, d)' in ask(database, 'path(e, Y).')
@@ -0,0 +1,137 @@
+import re
+
+import pytest
+
+from prolog.trail import TrailEngine
+from prolog.solver import StackEngine
+from prolog.wam import WamEngine
+
+ENGINES = [TrailEngine, StackEngine, WamEngine]
+
+FRESH = '''
+pair(A, B) :- mk(A), mk(B).
+same(A, A) :- mk(A).
+mk([H]).
+'''
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_fresh_variables_get_distinct_names(consult, ask, engine):
+    database = consult(FRESH, engine=engine)
+    [answer] = ask(database, 'pair(X, Y).')
+    assert answer.startswith('pair([_H') and answer.count('_H') == 2
+    first, second = answer[len('pair(['):-2].split('], [')
+    assert first != second
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_shared_variable_keeps_one_name(consult, ask, engine):
+    database = consult(FRESH, engine=engine)
+    [answer] = ask(database, 'same(X, Y).')
+    first, second = answer[len('same(['):-2].split('], [')
+    assert first == second
+
+
+PATH_ANSWERS = ['path(a, b)', 'path(a, c)', 'path(a, a)', 'path(a, d)']
+
+REACH = '''
+reach(X, Y) :- path(X, Y).
+'''
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_tabled_goals_leave_the_engine(consult, ask, engine):
+    database = consult('path.pl', engine=engine)
+    assert ask(database, 'path(a, X).') == PATH_ANSWERS
+    assert ask(database, 'edge(c, X).') == ['edge(c, a)', 'edge(c, d)']
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_goal_reaching_a_table_leaves_the_engine(consult, ask, engine):
+    database = consult('path.pl', REACH, engine=engine)
+    assert ask(database, 'reach(a, X).') == [
+        'reach(a, b)', 'reach(a, c)', 'reach(a, a)', 'reach(a, d)'
+    ]
+
+
+LEFT = '''
+edge(a, b).
+edge(b, c).
+edge(c, a).
+path(X, Y) :- path(X, Z), edge(Z, Y).
+path(X, Y) :- edge(X, Y).
+'''
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_datalog_with_engine(consult, ask, engine):
+    database = consult(LEFT, engine=engine, datalog=True)
+    assert sorted(ask(database, 'path(a, X).')) == ['path(a, a)', 'path(a, b)', 'path(a, c)']
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_cache_with_engine(consult, ask, engine):
+    database = consult('older.pl', engine=engine, cache_size=10)
+    expected = ['older(masha, sasha, rule)', 'older(masha, julia, rule)']
+    assert ask(database, 'older(masha, Y, rule).') == expected
+    assert ask(database, 'older(masha, Y, rule).') == expected
+    assert database.cache.hits == 1
+
+
+GROW = '''
+f(1).
+f(2).
+f(p(1)).
+g(X) :- f(X).
+dup(X) :- f(X), assertz(f(X)).
+'''
+
+
+def grow(consult, ask, **options):
+    database = consult(GROW, **options)
+    answers = [ask(database, 'g(X).')]
+    for fact in ['f(3).', 'f(p(2)).', 'f(q(1)).', 'f(2).', 'f(Y).', 'f(4).']:
+        database.insert_rule_right(consult(fact).rules[0])
+        answers.append(ask(database, 'g(X).'))
+        answers.append(ask(database, 'f(2).'))
+        answers.append(ask(database, 'f(p(Z)).'))
+    answers.append(ask(database, 'dup(X).'))
+    answers.append(ask(database, 'f(X).'))
+    # свободные переменные движки называют по-разному
+    return [[re.sub(r'\b_?[A-Z]\w*', '_', answer) for answer in items] for items in answers]
+
+
+def test_wam_assertz_matches_trail_engine(consult, ask):
+    # TrailEngine перебирает клаузы хранилища напрямую, без скомпилированных процедур
+    assert grow(consult, ask, engine=WamEngine) == grow(consult, ask, engine=TrailEngine)
+
+
+def test_wam_assertz_patches_procedure(consult, ask):
+    database = consult(GROW, engine=WamEngine)
+    ask(database, 'f(X).')
+    key = database.rules[0].head.key
+    procedure = database.engine.procedures[key][2]
+    for number in range(3, 10):
+        database.insert_rule_right(consult(f'f({number}).').rules[0])
+        assert ask(database, f'f({number}).') == [f'f({number})']
+    assert database.engine.procedures[key][2] is procedure
+
+
+NESTED = '''
+:- table path/2.
+path(X, Y) :- edge(X, Y).
+edge(a, b).
+f(b, 1).
+f(b, 2).
+g(1).
+g(2).
+q(Y, W) :- path(a, Z), f(Z, Y), g(W).
+'''
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_nested_engine_calls_keep_their_trail(consult, ask, engine):
+    # f и g решает движок, пока q перебирает дерево: у каждого вызова свой след
+    expected = ['q(1, 1)', 'q(1, 2)', 'q(2, 1)', 'q(2, 2)']
+    assert ask(consult(NESTED), 'q(Y, W).') == expected
+    assert ask(consult(NESTED, engine=engine), 'q(Y, W).') == expected
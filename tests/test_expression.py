@@ -0,0 +1,36 @@
+from prolog.types import Variable, make_number
+from conftest import parse
+
+ARITHMETIC = '''
+count(0).
+count(N) :- N > 0, M is N - 1, count(M).
+copy(X, Y) :- Y is X.
+above(X, Y) :- X > Y.
+double(X, Y) :- Y is (X + 1) * 2.
+'''
+
+
+def test_arithmetic_and_comparison(consult, ask):
+    database = consult(ARITHMETIC)
+    assert ask(database, 'count(200).') == ['count(200)']
+    assert ask(database, 'copy(3, Y).') == ['copy(3, 3)']
+    assert ask(database, 'above(3, 2).') == ['above(3, 2)']
+    assert ask(database, 'above(2, 3).') == []
+    assert ask(database, 'double(4, Y).') == ['double(4, 10)']
+    assert ask(database, 'Y is 2 * 3.') == ['6']
+
+
+def test_square(consult, ask):
+    assert ask(consult('sqare.pl'), 'place(3, 4, P).') == ['place(3, 4, 12)']
+
+
+def test_substitution_keeps_one_value_per_slot():
+    [rule] = parse('f(N, M) :- M is N - 1.')
+    # как при спуске по рекурсии: каждая активация переименовывает N заново
+    expression, previous = rule.body, rule.variables[0]
+    for _ in range(100):
+        fresh = Variable('N')
+        expression = expression.substitute({previous: fresh})
+        previous = fresh
+    assert len(expression._values) == 1
+    assert expression.substitute({previous: make_number(5)}).evaluate() == make_number(4)
@@ -0,0 +1,46 @@
+from prolog.frame import Frame
+from prolog.types import Variable
+
+from conftest import parse
+
+LENGTH = '''
+len(L, N) :- len(L, 0, N).
+len([], N, N).
+len([_|T], A, N) :- B is A + 1, len(T, B, N).
+'''
+
+NATURALS = '''
+nat(z).
+nat(s(X)) :- nat(X).
+'''
+
+
+def test_rename_gives_fresh_copy_per_activation():
+    [rule] = parse('p(X, Y) :- q(X, Y).')
+    x, y = rule.variables
+    first, second = Frame(rule.variables), Frame(rule.variables)
+    assert first.rename(x) is first.rename(x)
+    assert first.rename(x) is not x
+    assert first.rename(x) is not second.rename(x)
+    assert first.rename(x) is not first.rename(y)
+
+
+def test_foreign_variables_are_not_renamed():
+    [rule] = parse('p(X) :- q(X).')
+    frame = Frame(rule.variables)
+    other = Variable('X')
+    assert frame.rename(other) is other
+    assert frame.get(other, 'none') == 'none'
+
+
+def test_accumulator_length(consult, ask):
+    database = consult(LENGTH)
+    assert ask(database, 'len([a, b, c], N).') == ['len([a, b, c], 3)']
+    assert ask(database, 'len([], N).') == ['len([], 0)']
+
+
+def test_recursive_activations_do_not_share_variables(consult, ask):
+    database = consult(NATURALS)
+    assert ask(database, 'nat(X).', limit=3) == [
+        'nat(z)', 'nat(s(z))', 'nat(s(s(z)))'
+    ]
@@ -0,0 +1,68 @@
+import pytest
+
+from prolog.hamt import EMPTY, SMALL, Bindings
+
+
+class Colliding:
+    # разные ключи с одинаковым хешем
+    def __init__(self, name):
+        self.name = name
+
+    def __hash__(self):
+        return 42
+
+
+def test_set_is_persistent():
+    first = EMPTY.set('a', 1)
+    second = first.set('b', 2)
+    third = second.set('a', 3)
+    assert dict(first.items()) == {'a': 1}
+    assert dict(second.items()) == {'a': 1, 'b': 2}
+    assert dict(third.items()) == {'a': 3, 'b': 2}
+    assert len(EMPTY) == 0 and len(third) == 2
+
+
+def test_same_value_keeps_instance():
+    bindings = EMPTY.set('a', 1)
+    assert bindings.set('a', 1) is bindings
+
+
+def test_large_mappings_use_tree():
+    size = SMALL * 40
+    bindings = EMPTY.update((key, key * key) for key in range(size))
+    assert type(bindings.root) is not tuple
+    assert len(bindings) == size
+    assert all(bindings[key] == key * key for key in range(size))
+    assert sorted(bindings) == list(range(size))
+    assert size not in bindings
+    updated = bindings.set(7, 'seven')
+    assert updated[7] == 'seven' and bindings[7] == 49
+    assert len(updated) == size
+
+
+def test_hash_collisions():
+    keys = [Colliding(i) for i in range(SMALL + 4)]
+    bindings = EMPTY.update((key, key.name) for key in keys)
+    bindings = bindings.update((key, key) for key in range(20))
+    assert type(bindings.root) is not tuple
+    assert all(bindings[key] == key.name for key in keys)
+    assert bindings.get(Colliding(0)) is None
+    replaced = bindings.set(keys[3], 'three')
+    assert replaced[keys[3]] == 'three' and bindings[keys[3]] == 3
+    assert len(replaced) == len(bindings) == len(keys) + 20
+
+
+def test_missing_key():
+    bindings = Bindings()
+    assert bindings.get('x', 'none') == 'none'
+    with pytest.raises(KeyError):
+        bindings['x']
+
+
+def test_long_conjunction(consult, ask):
+    # больше SMALL переменных в одной конъюнкции
+    names = [f'X{i}' for i in range(SMALL * 3)]
+    goals = ', '.join(f'n({name})' for name in names)
+    database = consult('n(1).', f'all({", ".join(names)}) :- {goals}.')
+    args = ', '.join('1' for _ in names)
+    assert ask(database, f'all({", ".join(names)}).') == [f'all({args})']
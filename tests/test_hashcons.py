@@ -0,0 +1,31 @@
+from prolog.hashcons import TermPool
+from prolog.parser import Parser
+from prolog.scanner import Scanner
+from prolog.types import make_number
+
+
+def pooled(text):
+    pool = TermPool()
+    return Parser(Scanner(text).tokenize(), pool=pool).parse(), pool
+
+
+def test_ground_terms_are_shared():
+    rules, pool = pooled('p(f(a), [1, 2]).\nq(f(a), [1, 2]).\nr(f(X)).\n')
+    p, q, r = (rule.head for rule in rules)
+    assert p.args[0] is q.args[0]
+    assert p.args[1] is q.args[1]
+    assert r.args[0] is not p.args[0]
+
+
+def test_small_numbers_are_the_shared_instances():
+    rules, pool = pooled('n(5).\nm(5, 100000).\nk(100000).\n')
+    n, m, k = (rule.head for rule in rules)
+    assert n.args[0] is make_number(5)
+    assert m.args[0] is make_number(5)
+    assert m.args[1] is k.args[0]
+
+
+def test_pooled_program_answers(consult, ask):
+    rules, _ = pooled('n(5).\nm(X) :- n(X).\n')
+    from prolog.interpreter import Database
+    assert ask(Database(rules), 'm(X).') == ['m(5)']
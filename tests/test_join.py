@@ -0,0 +1,66 @@
+import pytest
+
+from prolog import join as join_module
+from prolog.interpreter import Database
+
+FACTS = ''.join(f'f(a{i}, b{i % 7}).\n' for i in range(300)) + \
+    ''.join(f'h(b{i}, c{i}).\nh(b{i}, d{i}).\n' for i in range(7))
+
+RULES = '''
+g(X, Y) :- f(X, Z), h(Z, Y).
+first(Y) :- f(X, Z), h(Z, Y), !.
+pair(X, Y) :- f(X, b3), h(b3, Y).
+'''
+
+
+@pytest.fixture
+def steps(monkeypatch):
+    # шаги всех соединений, построенных за тест
+    created = []
+
+    class Recorded(join_module.JoinStep):
+        __slots__ = ()
+
+        def __init__(self, *args):
+            super().__init__(*args)
+            created.append(self)
+
+    monkeypatch.setattr(join_module, 'JoinStep', Recorded)
+    return created
+
+
+def without_join(monkeypatch):
+    monkeypatch.setattr(Database, 'fact_run', lambda self, goals, index: 0)
+
+
+def test_join_matches_nested_loops(consult, ask, monkeypatch):
+    queries = ['g(X, Y).', 'g(a10, Y).', 'first(Y).', 'pair(X, d3).', 'g(X, c2).']
+    joined = [ask(consult(FACTS, RULES), text) for text in queries]
+    without_join(monkeypatch)
+    assert joined == [ask(consult(FACTS, RULES), text) for text in queries]
+
+
+def test_first_answer_does_not_build_tables(consult, ask, steps):
+    database = consult(FACTS, RULES)
+    assert ask(database, 'first(Y).') == ['first(c0)']
+    assert steps and all(item.table is None for item in steps)
+    assert sum(item.scanned for item in steps) < 10
+
+
+def test_join_streams_answers(consult, ask):
+    database = consult(FACTS, RULES)
+    assert ask(database, 'g(X, Y).', limit=3) == ['g(a0, c0)', 'g(a0, d0)', 'g(a1, c1)']
+
+
+def test_long_join_builds_table(consult, ask, steps):
+    database = consult(FACTS, RULES)
+    assert len(ask(database, 'g(X, Y).')) == 600
+    assert steps[1].table is not None
+
+
+def test_join_sees_asserted_facts(consult, ask, monkeypatch):
+    program = 'p(1).\np(2).\nq(1, a).\nq(2, b).\n' + \
+        'r(X, Y) :- p(X), q(X, Y), assertz(q(2, c)).\n'
+    joined = ask(consult(program), 'r(X, Y).')
+    without_join(monkeypatch)
+    assert joined == ask(consult(program), 'r(X, Y).')
@@ -0,0 +1,51 @@
+import sys
+
+from prolog.types import Dot
+
+LISTS = '''
+mylast([X], X).
+mylast([_|T], X) :- mylast(T, X).
+mylen([], 0).
+mylen([_|T], N) :- mylen(T, M), N is M + 1.
+'''
+
+
+def numbers(size):
+    return '[' + ', '.join(map(str, range(size))) + ']'
+
+
+def test_racers(consult, ask):
+    database = consult('list.pl')
+    assert ask(database, 'racers([H|T]).') == ['racers([max, charles, fernando])']
+
+
+def test_head_and_tail(consult, ask):
+    database = consult(LISTS)
+    assert ask(database, 'mylast([a, b, c], X).') == ['mylast([a, b, c], c)']
+    assert ask(database, 'mylen([a, b, c], N).') == ['mylen([a, b, c], 3)']
+
+
+def test_recursion_over_tail_is_linear(consult, ask, monkeypatch):
+    # хвосты - виды на общий кортеж: при спуске по [_|T] элементы не
+    # сопоставляются заново, так что работа растёт линейно
+    matched = [0]
+    match_lsts = Dot.match_lsts
+
+    def counting(self, lst1, lst2):
+        matched[0] += len(lst1)
+        return match_lsts(self, lst1, lst2)
+
+    monkeypatch.setattr(Dot, 'match_lsts', counting)
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, 20000))
+    try:
+        database = consult(LISTS)
+        costs = []
+        for size in (500, 1000, 2000):
+            matched[0] = 0
+            [answer] = ask(database, f'mylast({numbers(size)}, X).')
+            assert answer.endswith(f', {size - 1})')
+            costs.append(matched[0])
+    finally:
+        sys.setrecursionlimit(limit)
+    assert costs[2] <= 4 * costs[0] + 100
@@ -0,0 +1,64 @@
+import pytest
+
+from prolog.frame import Frame
+from prolog.matcher import compile_head
+from prolog.parser import Parser
+from prolog.scanner import Scanner
+from conftest import parse
+
+HEADS = [
+    'p(a, b).',
+    'p(X, X).',
+    'p(X, f(X, Y), Y).',
+    'p(1, [a, b], X).',
+    'p([H|T], H, T).',
+    'p(f(g(X)), X).',
+]
+
+GOALS = [
+    'p(a, b).', 'p(a, Z).', 'p(Z, c).', 'p(c, c).', 'p(Z, W).',
+    'p(a, f(a, b), b).', 'p(Z, f(Z, W), c).', 'p(a, f(b, c), c).',
+    'p(1, [a, b], Z).', 'p(2, [a, b], Z).', 'p(1, [a, c], Z).',
+    'p([1, 2, 3], Z, W).', 'p([1], 1, Z).', 'p([], Z, W).',
+    'p(f(g(1)), Z).', 'p(f(h(1)), Z).', 'p(Z, 1).',
+]
+
+
+def query(text):
+    return Parser(Scanner(text).tokenize()).parse_query()
+
+
+def compiled(rule, goal):
+    frame = Frame(rule.variables)
+    match = compile_head(rule.head)(goal, frame)
+    if match is None:
+        return None
+    frame.bindings = match
+    return str(rule.head.substitute(frame))
+
+
+def interpreted(rule, goal):
+    head = rule.head.substitute(Frame(rule.variables))
+    match = head.match(goal)
+    if match is None:
+        return None
+    return str(head.substitute(match))
+
+
+@pytest.mark.parametrize('head', HEADS)
+def test_compiled_head_matches_like_term_match(head):
+    [rule] = parse(head)
+    for text in GOALS:
+        goal = query(text)
+        if len(goal.args) != len(rule.head.args):
+            continue
+        assert compiled(rule, goal) == interpreted(rule, goal), text
+
+
+def test_frames_are_independent():
+    [rule] = parse('p(X, f(X)).')
+    match = compile_head(rule.head)
+    first, second = Frame(rule.variables), Frame(rule.variables)
+    assert match(query('p(a, Z).'), first) is not None
+    assert match(query('p(b, Z).'), second) is not None
+    assert first.rename(rule.variables[0]) is not second.rename(rule.variables[0])
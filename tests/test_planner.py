@@ -0,0 +1,75 @@
+from prolog import interpreter
+
+ANCESTORS = '''
+parent(ann, bob).
+parent(bob, cid).
+parent(cid, dan).
+parent(ann, eve).
+parent(eve, gus).
+parent(gus, hal).
+anc(X, Y) :- parent(X, Y).
+anc(X, Y) :- parent(X, Z), anc(Z, Y).
+'''
+
+JOIN = ''.join(f'big(k{i}, v{i % 5}).\n' for i in range(40)) + '''
+small(v1, s).
+pick(X, S) :- big(X, V), small(V, S).
+'''
+
+
+def both(consult, ask, program, text):
+    plain = ask(consult(program), text)
+    reordered = ask(consult(program, reorder=True), text)
+    return sorted(plain), sorted(reordered)
+
+
+def test_recursive_rule_is_not_reordered(consult, ask):
+    plain, reordered = both(consult, ask, ANCESTORS, 'anc(X, Y).')
+    assert plain == reordered
+    assert len(plain) == 12
+
+
+def test_older(consult, ask):
+    plain, reordered = both(consult, ask, 'older.pl', 'older(X, Y, Z).')
+    assert plain == reordered
+
+
+def test_facts_are_reordered(consult, ask):
+    plain, reordered = both(consult, ask, JOIN, 'pick(X, S).')
+    assert plain == reordered == sorted(f'pick(k{i}, s)' for i in range(1, 40, 5))
+
+
+def test_plan_is_cached_per_clause(consult, ask, monkeypatch):
+    calls = [0]
+    plan = interpreter.plan
+
+    def counting(*args):
+        calls[0] += 1
+        return plan(*args)
+
+    monkeypatch.setattr(interpreter, 'plan', counting)
+    database = consult(ANCESTORS, reorder=True)
+    for _ in range(5):
+        assert len(ask(database, 'anc(ann, Y).')) == 6
+    assert calls[0] <= 2
+    database.insert_rule_right(consult('parent(dan, fay).').rules[0])
+    assert len(ask(database, 'anc(ann, Y).')) == 7
+    assert calls[0] <= 4
+
+
+CUT = '''
+big(1).
+big(2).
+big(3).
+one(3).
+one(2).
+pair(X) :- big(X), one(X), !.
+after(X, Y) :- big(X), !, big(Y), one(Y).
+'''
+
+
+def test_goals_before_cut_keep_order(consult, ask):
+    # one/1 меньше big/1, но перестановка изменила бы, что оставит отсечение
+    database = consult(CUT, reorder=True)
+    assert ask(database, 'pair(X).') == ['pair(2)']
+    assert sorted(ask(database, 'after(X, Y).')) == ['after(1, 2)', 'after(1, 3)']
@@ -0,0 +1,50 @@
+import pytest
+
+from prolog.store import ClauseStore
+from prolog.trail import TrailEngine
+from prolog.solver import StackEngine
+from prolog.wam import WamEngine
+from conftest import parse
+
+ENGINES = [None, TrailEngine, StackEngine, WamEngine]
+
+UPDATES = '''
+p(1).
+p(2).
+grow(X) :- p(X), assertz(p(3)).
+seen(X) :- p(X), drop(X).
+drop(1) :- retract(p(2)).
+drop(2).
+'''
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_assert_during_call_is_not_seen(consult, ask, engine):
+    database = consult(UPDATES, engine=engine)
+    assert ask(database, 'grow(X).') == ['grow(1)', 'grow(2)']
+    assert ask(database, 'p(X).') == ['p(1)', 'p(2)', 'p(3)', 'p(3)']
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_retract_during_call_keeps_started_clauses(consult, ask, engine):
+    database = consult(UPDATES, engine=engine)
+    assert ask(database, 'seen(X).') == ['seen(1)', 'seen(2)']
+    assert ask(database, 'p(X).') == ['p(1)']
+
+
+def test_generations():
+    first, second, third = parse('p(1).\np(2).\np(3).')
+    store = ClauseStore([first])
+    start = store.generation
+    store.add_last(second)
+    added = store.generation
+    assert added > start
+    store.remove(first)
+    goal = first.head
+    assert [rule for rule in store.select(goal)] == []
+    clauses = list(store.predicate(goal.key))
+    assert [clause.visible(start) for clause in clauses] == [True, False]
+    assert [clause.visible(added) for clause in clauses] == [True, True]
+    assert [clause.visible(store.generation) for clause in clauses] == [False, True]
+    store.add_first(third)
+    assert [str(rule.head) for rule in store] == ['p(3)', 'p(2)']
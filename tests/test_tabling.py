@@ -0,0 +1,32 @@
+PATH_ANSWERS = ['path(a, b)', 'path(a, c)', 'path(a, a)', 'path(a, d)']
+
+
+def test_left_recursion_terminates(consult, ask):
+    database = consult('path.pl')
+    assert ask(database, 'path(a, X).') == PATH_ANSWERS
+
+
+def test_bound_call(consult, ask):
+    database = consult('path.pl')
+    assert ask(database, 'path(b, d).') == ['path(b, d)']
+    assert ask(database, 'path(d, X).') == []
+
+
+def test_repeated_query_uses_complete_table(consult, ask):
+    database = consult('path.pl')
+    assert ask(database, 'path(a, X).') == PATH_ANSWERS
+    assert ask(database, 'path(a, X).') == PATH_ANSWERS
+
+
+def test_assert_invalidates_tables(consult, ask):
+    database = consult('path.pl')
+    assert ask(database, 'path(d, X).') == []
+    database.insert_rule_right(consult('edge(d, e).').rules[0])
+    assert ask(database, 'path(d, X).') == ['path(d, e)']
+
+
+def test_untabled_program_unchanged(consult, ask):
+    database = consult('older.pl')
+    assert ask(database, 'older(masha, Y, rule).') == [
+        'older(masha, sasha, rule)', 'older(masha, julia, rule)'
+    ]